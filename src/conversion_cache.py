@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+
+conversion_manifest_path = "data/summary/conversion_manifest.json"
+
+# Source files written between saves of the manifest
+save_every = 50
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_path_for(file_path, output_folder):
+    """Return the text file a source document is converted to"""
+    subfolder = os.path.basename(os.path.dirname(file_path))
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(output_folder, subfolder, f"{base_name}.txt")
+
+
+class ConversionCache:
+    """Manifest of converted documents, keyed by output path.
+
+    Each entry records the source path, the sha256 of the source and the
+    converter settings used. An output is current while all three match
+    and the output file exists. Outputs made with any of accepted_settings
+    also count as current. File size and modification time are kept so
+    unchanged sources are not hashed again on every run.
+    """
+
+    def __init__(self, settings, path=None, accepted_settings=None):
+        self.settings = settings
+        self.accepted_settings = [settings, *(accepted_settings or [])]
+        self.path = path or conversion_manifest_path
+        self.entries = {}
+        self.hashes = {}
+        self.unsaved = 0
+        if os.path.exists(self.path):
+            with open(self.path, mode="r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def source_hash(self, source_path, entry=None):
+        """Hash a source, reusing the recorded hash if it is unmodified"""
+        stat = os.stat(source_path)
+        # Keyed by size and modification time too, so a long-lived cache
+        # notices files that are replaced under the same name
+        key = (source_path, stat.st_size, stat.st_mtime_ns)
+        if key in self.hashes:
+            return self.hashes[key]
+
+        if (
+            entry
+            and entry["source"] == source_path
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            sha256 = entry["sha256"]
+        else:
+            sha256 = file_sha256(source_path)
+        self.hashes[key] = sha256
+        return sha256
+
+    def is_current(self, source_path, output_path):
+        entry = self.entries.get(output_path)
+        if (
+            entry is None
+            or entry["source"] != source_path
+            or entry["settings"] not in self.accepted_settings
+            or not os.path.exists(output_path)
+        ):
+            return False
+        return self.source_hash(source_path, entry) == entry["sha256"]
+
+    def filter_stale(self, file_paths, output_folder):
+        """Return the sources whose output is missing or out of date"""
+        return [
+            file_path
+            for file_path in file_paths
+            if not self.is_current(file_path, output_path_for(file_path, output_folder))
+        ]
+
+    def plan(self, file_paths, output_folder):
+        """Clean orphaned outputs and return the sources that need converting"""
+        self.remove_orphans(output_folder)
+        stale = self.filter_stale(file_paths, output_folder)
+        print(f"Skipping {len(file_paths) - len(stale)} unchanged documents")
+        return stale
+
+    def record(self, source_path, output_path):
+        stat = os.stat(source_path)
+        self.entries[output_path] = {
+            "source": source_path,
+            "sha256": self.source_hash(source_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "settings": self.settings,
+        }
+        self.unsaved += 1
+        if self.unsaved >= save_every:
+            self.save()
+
+    def remove_orphans(self, output_folder):
+        """Delete outputs in output_folder whose source no longer exists"""
+        output_folder = os.path.abspath(output_folder)
+        removed = 0
+        for output_path, entry in list(self.entries.items()):
+            in_folder = (
+                os.path.commonpath([output_folder, os.path.abspath(output_path)])
+                == output_folder
+            )
+            if in_folder and not os.path.exists(entry["source"]):
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                del self.entries[output_path]
+                removed += 1
+        if removed:
+            print(f"Removed {removed} outputs of deleted documents")
+            self.save()
+        return removed
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(temp_path, self.path)
+        self.unsaved = 0
@@ -0,0 +1,235 @@
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Seconds between scans of the watched folder
+poll_interval = 2.0
+
+# Port of the local status endpoint, 0 to disable it
+status_port = 8765
+
+# Finished documents listed in the status
+recent_limit = 20
+
+
+def scan_folder(input_folder, extensions):
+    """Return (size, mtime_ns) for each supported file in a folder, by path"""
+    versions = {}
+    for root, dirs, files in os.walk(input_folder):
+        for file in files:
+            _, extension = os.path.splitext(file)
+            if extension.lower() not in extensions:
+                continue
+            file_path = os.path.join(root, file)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            versions[file_path] = (stat.st_size, stat.st_mtime_ns)
+    return versions
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """GET /status and /queue report progress, POST /queue?path=... adds a file"""
+
+    def send_json(self, code, data):
+        body = json.dumps(data, indent=1).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlparse(self.path).path
+        if path in ("/", "/status"):
+            self.send_json(200, service.get_status())
+        elif path == "/queue":
+            self.send_json(200, service.get_queue())
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path != "/queue":
+            self.send_json(404, {"error": "Not found"})
+            return
+        file_path = parse_qs(url.query).get("path", [""])[0]
+        error = service.check_path(file_path)
+        if error:
+            self.send_json(400, {"error": error})
+            return
+        service.enqueue(file_path)
+        self.send_json(202, {"queued": file_path})
+
+    def log_message(self, format, *args):
+        # Status is polled often, so requests are not logged
+        pass
+
+
+class ConversionService:
+    """Converts documents as they arrive in a folder, keeping models loaded.
+
+    A watcher thread scans input_folder every interval seconds and queues
+    files once their size and modification time are unchanged between two
+    scans, so partly copied files are not read. select(file_paths) returns
+    the files that need converting and convert(file_path) converts one,
+    returning a description of the route taken. Conversions run on the
+    thread that calls run(), which owns the converters.
+    """
+
+    def __init__(
+        self, input_folder, extensions, select, convert, interval=None, port=None
+    ):
+        self.input_folder = input_folder
+        self.extensions = extensions
+        self.select = select
+        self.convert = convert
+        self.interval = interval or poll_interval
+        self.port = status_port if port is None else port
+        self.queue = queue.Queue()
+        self.queued = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.started = time.time()
+        self.current = None
+        self.converted = 0
+        self.failed = 0
+        self.recent = []
+
+    def check_path(self, file_path):
+        """Return why a file cannot be queued, or None if it can"""
+        input_folder = os.path.abspath(self.input_folder)
+        absolute_path = os.path.abspath(file_path)
+        if os.path.commonpath([input_folder, absolute_path]) != input_folder:
+            return f"Not in {self.input_folder}"
+        if os.path.splitext(file_path)[1].lower() not in self.extensions:
+            return "Unsupported file type"
+        if not os.path.isfile(file_path):
+            return "File not found"
+        return None
+
+    def enqueue(self, file_path):
+        with self.lock:
+            if file_path in self.queued:
+                return
+            self.queued.append(file_path)
+        self.queue.put(file_path)
+
+    def get_queue(self):
+        with self.lock:
+            return list(self.queued)
+
+    def get_status(self):
+        with self.lock:
+            return {
+                "state": "converting" if self.current else "idle",
+                "current": self.current,
+                "queued": len(self.queued),
+                "converted": self.converted,
+                "failed": self.failed,
+                "uptime_seconds": round(time.time() - self.started),
+                "recent": list(self.recent),
+            }
+
+    def watch(self):
+        """Queue new and changed files once they have stopped changing"""
+        handled = {}
+        candidates = {}
+        while not self.stopping.is_set():
+            versions = scan_folder(self.input_folder, self.extensions)
+            ready = [
+                file_path
+                for file_path, version in versions.items()
+                if handled.get(file_path) != version
+                and candidates.get(file_path) == version
+            ]
+            for file_path in ready:
+                handled[file_path] = versions[file_path]
+            handled = {
+                file_path: version
+                for file_path, version in handled.items()
+                if file_path in versions
+            }
+            candidates = {
+                file_path: version
+                for file_path, version in versions.items()
+                if handled.get(file_path) != version
+            }
+
+            if ready:
+                try:
+                    for file_path in self.select(sorted(ready)):
+                        self.enqueue(file_path)
+                except Exception as e:
+                    print(f"Error checking new documents: {e}")
+            self.stopping.wait(self.interval)
+
+    def start_server(self):
+        if not self.port:
+            return None
+        server = ThreadingHTTPServer(("127.0.0.1", self.port), StatusHandler)
+        server.daemon_threads = True
+        server.service = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Status: http://127.0.0.1:{self.port}/status")
+        return server
+
+    def record(self, file_path, seconds, route=None, error=None):
+        with self.lock:
+            self.current = None
+            if error:
+                self.failed += 1
+            else:
+                self.converted += 1
+            self.recent.insert(
+                0,
+                {
+                    "file": file_path,
+                    "route": route,
+                    "seconds": round(seconds, 1),
+                    "error": error,
+                    "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                },
+            )
+            del self.recent[recent_limit:]
+
+    def run(self):
+        """Convert queued documents until interrupted"""
+        server = self.start_server()
+        threading.Thread(target=self.watch, daemon=True).start()
+        print(f"Watching {self.input_folder} every {self.interval}s (Ctrl+C to stop)")
+        try:
+            while True:
+                # Wake up regularly so Ctrl+C is handled while idle
+                try:
+                    file_path = self.queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                with self.lock:
+                    self.queued.remove(file_path)
+                    self.current = file_path
+                print(f"Processing: {file_path} ({self.queue.qsize()} queued)")
+                start_time = time.time()
+                try:
+                    route = self.convert(file_path)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    print(f"Error processing {file_path}: {error}")
+                    self.record(file_path, time.time() - start_time, error=error)
+                    continue
+                seconds = time.time() - start_time
+                print(f"Processed ({route}) in {seconds:.1f}s: {file_path}")
+                self.record(file_path, seconds, route)
+        except KeyboardInterrupt:
+            print("Stopping conversion service")
+        finally:
+            self.stopping.set()
+            if server:
+                server.shutdown()
@@ -0,0 +1,449 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+from conversion_cache import ConversionCache, output_path_for
+from conversion_service import ConversionService, poll_interval, status_port
+from header_pages import start_full_pass
+from memory_usage import resident_memory_mb
+from ocr_backends import BACKENDS, get_backend
+from quarantine import Quarantine
+
+input_folder = "data/downloaded_docs/"
+output_folder = "data/converted_text/"
+
+# Seconds between checks of the worker processes' memory use
+monitor_interval = 1.0
+
+
+def get_file_paths(input_folder, extensions):
+    file_paths = []
+
+    # Loop through the files in the input folder
+    for root, dirs, files in os.walk(input_folder):
+        for file in sorted(files):
+            # Check if the backend supports the file extension
+            _, extension = os.path.splitext(file)
+            if extension.lower() in extensions:
+                # Construct the full file path
+                file_paths.append(os.path.join(root, file))
+
+    return sorted(file_paths)
+
+
+def open_cache(backend):
+    """Open the conversion cache for a backend's settings.
+
+    In header mode documents that were already converted in full are kept.
+    """
+    settings = backend.settings
+    accepted_settings = (
+        [{**settings, "first_pages": None}] if settings.get("first_pages") else []
+    )
+    return ConversionCache(settings, accepted_settings=accepted_settings)
+
+
+def write_output(output_file_path, chunks):
+    """Write text to the output file as it arrives, replacing it only when complete"""
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    temp_path = output_file_path + ".part"
+    try:
+        with open(temp_path, mode="w", encoding="utf8") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, output_file_path)
+
+
+def convert_file(backend, file_path, output_folder):
+    """Convert a document and write its text. Returns (file_path, route, error)."""
+    print(f"Processing ({backend.name}): {file_path}")
+    output_file_path = output_path_for(file_path, output_folder)
+    try:
+        write_output(output_file_path, backend.iter_text(file_path))
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+    print(f"Output: {output_file_path}")
+    return file_path, backend.route, None
+
+
+def worker_main(connection, backend_class, options, output_folder):
+    """Load the backend once, then convert the files sent until None arrives"""
+    backend = backend_class(**options)
+    backend.load()
+    # The parent has classified the files, so this only reads the index
+    backend.prepare([])
+    connection.send(("ready", None))
+    while True:
+        file_path = connection.recv()
+        if file_path is None:
+            break
+        connection.send(("started", backend.time_limit(file_path)))
+        connection.send(("done", convert_file(backend, file_path, output_folder)))
+
+
+class Worker:
+    """A conversion process and the document it is converting"""
+
+    def __init__(self, context, backend, output_folder):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(
+            target=worker_main,
+            args=(worker_connection, type(backend), backend.options, output_folder),
+            daemon=True,
+        )
+        self.process.start()
+        worker_connection.close()
+        self.ready = False
+        self.file_path = None
+        self.deadline = None
+        self.tasks = 0
+
+    def send(self, file_path):
+        self.file_path = file_path
+        self.deadline = None
+        self.connection.send(file_path)
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=30)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def convert_on_workers(
+    file_paths,
+    backend,
+    output_folder,
+    report,
+    workers=1,
+    max_memory_mb=None,
+    max_tasks_per_worker=None,
+):
+    """Convert files on worker processes that each load the backend once.
+
+    Each worker is checked every monitor_interval seconds. A worker over
+    max_memory_mb of resident memory, or past the backend's time_limit for
+    its document, is stopped, its document reported as failed with
+    MemoryError or TimeoutError, and a new worker started. Workers are also
+    replaced after max_tasks_per_worker files to release memory held by
+    OCR models.
+    """
+    context = multiprocessing.get_context("spawn")
+    pending = deque(file_paths)
+    pool = [
+        Worker(context, backend, output_folder)
+        for _ in range(min(workers, len(file_paths)))
+    ]
+
+    def replace(worker):
+        worker.kill()
+        pool[pool.index(worker)] = Worker(context, backend, output_folder)
+
+    def fail(worker, error):
+        report(worker.file_path, None, error)
+        replace(worker)
+
+    try:
+        while pending or any(worker.file_path for worker in pool):
+            for worker in pool:
+                if worker.ready and worker.file_path is None and pending:
+                    worker.send(pending.popleft())
+
+            ready = wait([worker.connection for worker in pool], monitor_interval)
+            for worker in list(pool):
+                if worker.connection in ready:
+                    try:
+                        message = worker.connection.recv()
+                    except EOFError:
+                        worker.process.join()
+                        if worker.file_path is None:
+                            raise RuntimeError(
+                                f"Worker failed to start (exit code "
+                                f"{worker.process.exitcode})"
+                            )
+                        fail(
+                            worker,
+                            f"Worker exited with code {worker.process.exitcode}",
+                        )
+                        continue
+                    kind, value = message
+                    if kind == "ready":
+                        worker.ready = True
+                        continue
+                    if kind == "started":
+                        if value:
+                            worker.deadline = time.time() + value
+                        continue
+                    worker.file_path = None
+                    worker.tasks += 1
+                    report(*value)
+                    if max_tasks_per_worker and worker.tasks >= max_tasks_per_worker:
+                        worker.stop()
+                        pool[pool.index(worker)] = Worker(
+                            context, backend, output_folder
+                        )
+                elif worker.file_path:
+                    memory_mb = max_memory_mb and resident_memory_mb(worker.process.pid)
+                    if memory_mb and memory_mb > max_memory_mb:
+                        fail(
+                            worker,
+                            f"MemoryError: worker used {memory_mb:.0f} MB, over "
+                            f"the {max_memory_mb} MB limit",
+                        )
+                    elif worker.deadline and time.time() > worker.deadline:
+                        fail(worker, "TimeoutError: document exceeded its time limit")
+    finally:
+        for worker in pool:
+            if worker.ready and worker.file_path is None:
+                worker.stop()
+            else:
+                worker.kill()
+
+
+def convert_documents(
+    input_folder,
+    output_folder,
+    backend,
+    use_cache=True,
+    workers=1,
+    max_memory_mb=None,
+    max_tasks_per_worker=None,
+):
+    """Convert every supported document in the input folder with a backend.
+
+    Unchanged documents already converted with the same backend settings
+    are skipped, as are quarantined documents. With workers > 1, a memory
+    limit or a backend that sets run_in_worker, documents are converted on
+    worker processes (see convert_on_workers) and reported as they finish.
+    """
+    file_paths = get_file_paths(input_folder, backend.extensions)
+
+    if not file_paths:
+        print("No supported documents found.")
+        return
+
+    cache = open_cache(backend) if use_cache else None
+    if cache:
+        file_paths = cache.plan(file_paths, output_folder)
+    quarantine = Quarantine()
+    file_paths = quarantine.filter(file_paths)
+    if not file_paths:
+        return
+
+    # Classify the PDFs up front, reusing earlier results from the index
+    backend.prepare(file_paths)
+
+    failed = 0
+    count = 0
+
+    def report(file_path, route, error):
+        nonlocal count, failed
+        count += 1
+        if error:
+            failed += 1
+            print(f"[{count}/{len(file_paths)}] Error processing {file_path}: {error}")
+            quarantine.record_failure(file_path, error)
+            return
+        print(f"[{count}/{len(file_paths)}] Processed ({route}): {file_path}")
+        if cache:
+            cache.record(file_path, output_path_for(file_path, output_folder))
+        quarantine.record_success(file_path)
+
+    if workers > 1 or max_memory_mb or backend.run_in_worker:
+        print(f"Starting {workers} workers ({backend.name})...")
+        convert_on_workers(
+            file_paths,
+            backend,
+            output_folder,
+            report,
+            workers,
+            max_memory_mb,
+            max_tasks_per_worker,
+        )
+    else:
+        for file_path in file_paths:
+            report(*convert_file(backend, file_path, output_folder))
+
+    if cache:
+        cache.save()
+    print(f"Converted {len(file_paths) - failed} documents ({failed} failed)")
+
+
+def watch_documents(
+    input_folder, output_folder, backend, use_cache=True, interval=None, port=None
+):
+    """Convert documents as they are downloaded, keeping the backend loaded.
+
+    Documents already in the input folder are converted first if they are
+    not in the cache. Progress is served at the status endpoint.
+    """
+    cache = open_cache(backend) if use_cache else None
+    quarantine = Quarantine()
+
+    # Load the models before the first document arrives
+    backend.load()
+
+    def select(file_paths):
+        if cache:
+            file_paths = cache.filter_stale(file_paths, output_folder)
+        file_paths = quarantine.filter(file_paths)
+        # Only a few files arrive per poll, so they are classified on this
+        # thread rather than by forking a pool from a threaded process
+        backend.prepare(file_paths, workers=1)
+        return file_paths
+
+    def convert(file_path):
+        file_path, route, error = convert_file(backend, file_path, output_folder)
+        if error:
+            quarantine.record_failure(file_path, error)
+            raise RuntimeError(error)
+        if cache:
+            cache.record(file_path, output_path_for(file_path, output_folder))
+            cache.save()
+        quarantine.record_success(file_path)
+        return route
+
+    service = ConversionService(
+        input_folder, backend.extensions, select, convert, interval, port
+    )
+    service.run()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Convert documents to text with a chosen OCR backend."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=list(BACKENDS),
+        default="tesseract",
+        help="Conversion backend (default: tesseract)",
+    )
+    parser.add_argument(
+        "--force-ocr",
+        action="store_true",
+        help="OCR every page, ignoring any embedded text layer",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="With the tesseract backend, clean up page images before OCR",
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=input_folder,
+        help=f"Input folder path (default: {input_folder})",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=output_folder,
+        help=f"Output folder path (default: {output_folder})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Convert every document, even if it is unchanged since the last run",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--first-pages",
+        type=int,
+        help="Only convert the first N pages, reading on until the order's "
+        "details are found, then convert in full in the background",
+    )
+    parser.add_argument(
+        "--no-full-pass",
+        action="store_true",
+        help="With --first-pages, do not start the background full conversion",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and convert new documents as they are downloaded",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=poll_interval,
+        help=f"With --watch, seconds between folder scans (default: {poll_interval})",
+    )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        default=status_port,
+        help=f"With --watch, local port of the status endpoint, 0 to disable "
+        f"(default: {status_port})",
+    )
+    parser.add_argument(
+        "--retry-quarantined",
+        action="store_true",
+        help="Retry documents quarantined after repeated failures",
+    )
+
+    args = parser.parse_args()
+
+    if args.preprocess and args.backend != "tesseract":
+        parser.error("--preprocess is only supported by the tesseract backend")
+    if args.first_pages and args.backend == "text-layer":
+        parser.error("--first-pages is not supported by the text-layer backend")
+    if args.watch and args.first_pages:
+        parser.error("--first-pages cannot be used with --watch")
+    if args.retry_quarantined:
+        Quarantine().release_all()
+
+    if args.backend == "text-layer":
+        backend = get_backend(args.backend)
+    elif args.backend == "tesseract":
+        backend = get_backend(
+            args.backend,
+            force_ocr=args.force_ocr,
+            preprocess=args.preprocess,
+            first_pages=args.first_pages,
+        )
+    else:
+        backend = get_backend(
+            args.backend, force_ocr=args.force_ocr, first_pages=args.first_pages
+        )
+
+    if args.watch:
+        watch_documents(
+            args.input,
+            args.output,
+            backend,
+            use_cache=not args.no_cache,
+            interval=args.poll_interval,
+            port=args.status_port,
+        )
+    else:
+        convert_documents(
+            args.input,
+            args.output,
+            backend,
+            use_cache=not args.no_cache,
+            workers=args.workers,
+        )
+
+    if args.first_pages and not args.no_full_pass:
+        start_full_pass()
@@ -1,42 +1,37 @@
-import os
+import time
 from pathlib import Path
 from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.base_models import InputFormat
+from docling.datamodel.base_models import ConversionStatus, InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
+from header_pages import has_header, header_page_limit
+from utilities.count_text_pdfs import has_extractable_text
 
 input_folder = "data/downloaded_docs/"
 output_folder = "data/converted_text/"
 
-# Supported file extensions
-SUPPORTED_EXTENSIONS = {".pdf", ".docx"}
+# Limits for unattended runs. PDFs longer than chunk_pages are converted a
+# chunk at a time, and docling stops a chunk after page_timeout seconds per page
+document_timeout = 900
+page_timeout = 30
+chunk_pages = 20
 
+# Descriptions of the conversion routes used in the log
+ROUTE_LABELS = {"text": "text layer", "ocr": "OCR"}
 
-def get_file_paths(input_folder):
-    file_paths = []
 
-    # Loop through the files in the input folder
-    for root, dirs, files in os.walk(input_folder):
-        for file in files:
-            # Check if file has a supported extension
-            _, extension = os.path.splitext(file)
-            if extension.lower() in SUPPORTED_EXTENSIONS:
-                # Construct the full file path
-                file_path = os.path.join(root, file)
-                file_paths.append(file_path)
-
-    return file_paths
-
-
-def create_converter(force_ocr=False):
+def create_converter(force_ocr=False, do_ocr=True, timeout=None):
     """Create a DocumentConverter with appropriate OCR settings.
 
     EasyOCR is used by default. OCR is applied automatically when needed.
+    With do_ocr=False only the embedded text layer is read. timeout limits
+    each conversion to that many seconds.
     """
     pipeline_options = PdfPipelineOptions()
-    pipeline_options.do_ocr = True
+    pipeline_options.do_ocr = do_ocr
     pipeline_options.do_table_structure = True
+    pipeline_options.document_timeout = timeout
 
-    if force_ocr:
+    if do_ocr and force_ocr:
         pipeline_options.ocr_options.force_full_page_ocr = True
 
     converter = DocumentConverter(
@@ -47,58 +42,176 @@ def create_converter(force_ocr=False):
     return converter
 
 
-def docling_convert(file_path, output_folder, subfolder, converter):
-    """Convert a document using docling and save the text output."""
-    # Extract the file name
-    path, file_name = os.path.split(file_path)
-    base_name, extension = os.path.splitext(file_name)
+def chunk_timeout():
+    """Seconds docling is allowed for one conversion of up to chunk_pages pages"""
+    return page_timeout * chunk_pages
 
-    # Convert the document
+
+def convert_text(converter, file_path, page_range=None):
+    """Convert a document, or a (first, last) range of its pages, to text.
+
+    Raises TimeoutError if docling stopped at its time limit. If only some
+    pages failed, the text of the others is returned and the failed pages
+    are logged.
+    """
     input_path = Path(file_path)
-    result = converter.convert(input_path)
+    start_time = time.time()
+    if page_range:
+        result = converter.convert(input_path, page_range=page_range)
+    else:
+        result = converter.convert(input_path)
+
+    if result.status == ConversionStatus.PARTIAL_SUCCESS:
+        if time.time() - start_time >= chunk_timeout():
+            raise TimeoutError(
+                f"Conversion stopped early for pages {page_range or 'all'}"
+            )
+        first_page, last_page = page_range or (1, result.input.page_count)
+        last_page = min(last_page, result.input.page_count)
+        failed_pages = [
+            page
+            for page in range(first_page, last_page + 1)
+            if page not in result.document.pages
+        ]
+        print(f"Pages not converted: {failed_pages or 'unknown'}")
+        for error in result.errors:
+            print(f"Docling error: {error.error_message}")
 
     # Export to plain text
-    text_content = result.document.export_to_markdown(strict_text=True)
+    return result.document.export_to_markdown(strict_text=True)
+
+
+def docling_convert(file_path, converter, page_range=None, page_count=None):
+    """Convert a document using docling and return its text.
+
+    page_range (first, last) limits the conversion to those pages. PDFs
+    with more than chunk_pages pages are converted a chunk at a time, and
+    TimeoutError is raised once document_timeout seconds have passed. The
+    document limit is only checked between chunks here. Worker processes
+    are stopped as soon as a document runs over its limit (see
+    DoclingBackend.time_limit).
+    """
+    # Convert the document
+    first_page, last_page = page_range or (1, page_count or 0)
+    if page_count:
+        last_page = min(last_page, page_count)
+    start_time = time.time()
 
-    # Create the subfolder in the output folder if it doesn't exist
-    subfolder_path = os.path.join(output_folder, subfolder)
-    if not os.path.exists(subfolder_path):
-        os.makedirs(subfolder_path)
+    if last_page - first_page + 1 > chunk_pages:
+        parts = []
+        for chunk_start in range(first_page, last_page + 1, chunk_pages):
+            chunk_end = min(chunk_start + chunk_pages - 1, last_page)
+            print(f"Converting pages {chunk_start}-{chunk_end} of {last_page}")
+            parts.append(convert_text(converter, file_path, (chunk_start, chunk_end)))
+            if time.time() - start_time > document_timeout:
+                raise TimeoutError(
+                    f"Document exceeded {document_timeout}s at page {chunk_end}"
+                )
+        return "\n\n".join(parts)
 
-    # Write text to a file in the corresponding subfolder
-    output_file_path = os.path.join(subfolder_path, f"{base_name}.txt")
-    print(f"Output: {output_file_path}")
-    with open(output_file_path, mode="w", encoding="utf8") as f:
-        f.write(text_content)
+    return convert_text(
+        converter, file_path, (first_page, last_page) if page_range else None
+    )
 
 
-def process_documents(input_folder, output_folder, force_ocr=False):
-    """Process all supported documents in the input folder."""
-    file_paths = get_file_paths(input_folder)
+def page_count_of(file_path, index):
+    """Return the page count of a PDF from the index, or None if unknown."""
+    if index is None or not file_path.lower().endswith(".pdf"):
+        return None
+    return index.classification(file_path)["pages"] or None
 
-    if not file_paths:
-        print("No supported documents found.")
-        return
 
-    # Create converter once for all documents
-    print(f"Initializing converter (force_ocr={force_ocr})...")
-    converter = create_converter(force_ocr=force_ocr)
+def convert_pages(file_path, converter, first_pages=None, page_count=None):
+    """Convert a document, or only its opening pages if first_pages is set.
 
-    for file_path in file_paths:
-        print(f"Processing: {file_path}")
-        # Identify the subfolder name
-        subfolder = os.path.basename(os.path.dirname(file_path))
-        print(f"Subfolder: {subfolder}")
-        # Process the document and store it in the corresponding output subfolder
-        try:
-            docling_convert(file_path, output_folder, subfolder, converter)
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
+    In header mode the page range is doubled until the order's details are
+    found, up to header_page_limit pages.
+    """
+    if not first_pages or not file_path.lower().endswith(".pdf"):
+        return docling_convert(file_path, converter, page_count=page_count)
+
+    last_page = first_pages
+    previous_text = None
+    while True:
+        text_content = docling_convert(
+            file_path, converter, page_range=(1, last_page), page_count=page_count
+        )
+        # Stop when the details are found or the document has no more pages
+        if (
+            has_header(text_content)
+            or last_page >= min(header_page_limit, page_count or header_page_limit)
+            or text_content == previous_text
+        ):
+            return text_content
+        previous_text = text_content
+        last_page = min(last_page * 2, header_page_limit)
+
+
+def route_document(file_path, force_ocr=False, index=None):
+    """Return "text" for documents with a text layer and "ocr" for scans."""
+    if force_ocr:
+        return "ocr"
+    if Path(file_path).suffix.lower() != ".pdf":
+        return "text"
+    if index is not None:
+        return "text" if index.has_text(file_path) else "ocr"
+    return "text" if has_extractable_text(file_path) else "ocr"
+
+
+def get_converter(converters, route, force_ocr=False):
+    """Return the converter for a route, creating it on first use."""
+    if route not in converters:
+        print(
+            f"Initializing {ROUTE_LABELS[route]} converter (force_ocr={force_ocr})..."
+        )
+        # Docling loads a pipeline's models again for each distinct set of
+        # options, so one limit covers the largest chunk. The limit per page
+        # is enforced by stopping the worker process.
+        converters[route] = create_converter(
+            force_ocr=force_ocr,
+            do_ocr=route == "ocr",
+            timeout=chunk_timeout(),
+        )
+    return converters[route]
+
+
+def convert_document(
+    file_path, converters, force_ocr=False, index=None, first_pages=None
+):
+    """Convert a document on the cheapest route that yields text.
+
+    Born-digital PDFs are read from their text layer without OCR. If that
+    produces no text the document is converted again with OCR. Returns
+    the route taken and the text.
+    """
+    route = route_document(file_path, force_ocr, index)
+    page_count = page_count_of(file_path, index)
+    print(f"Route: {ROUTE_LABELS[route]}")
+    converter = get_converter(converters, route, force_ocr)
+    text_content = convert_pages(file_path, converter, first_pages, page_count)
+
+    if (
+        route == "text"
+        and file_path.lower().endswith(".pdf")
+        and not text_content.strip()
+    ):
+        print("No text in text layer, converting with OCR")
+        route = "ocr"
+        converter = get_converter(converters, route, force_ocr)
+        text_content = convert_pages(file_path, converter, first_pages, page_count)
+
+    return route, text_content
 
 
 if __name__ == "__main__":
     import argparse
 
+    from conversion_service import poll_interval, status_port
+    from convert_documents import convert_documents, watch_documents
+    from header_pages import start_full_pass
+    from ocr_backends import DoclingBackend
+    from quarantine import Quarantine
+
     parser = argparse.ArgumentParser(
         description="Convert PDF and DOCX documents to text using docling with EasyOCR."
     )
@@ -119,7 +232,118 @@ if __name__ == "__main__":
         default=output_folder,
         help=f"Output folder path (default: {output_folder})",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        help="Stop a worker whose resident memory exceeds this many MB, failing "
+        "its document, and start a new one",
+    )
+    parser.add_argument(
+        "--max-tasks-per-worker",
+        type=int,
+        help="Replace each worker after this many documents",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Convert every document, even if it is unchanged since the last run",
+    )
+    parser.add_argument(
+        "--first-pages",
+        type=int,
+        help="Only convert the first N pages of PDFs, reading on until the "
+        "order's details are found, then convert in full in the background",
+    )
+    parser.add_argument(
+        "--no-full-pass",
+        action="store_true",
+        help="With --first-pages, do not start the background full conversion",
+    )
+    parser.add_argument(
+        "--document-timeout",
+        type=int,
+        default=document_timeout,
+        help=f"Seconds allowed per document. Worker processes are stopped when "
+        f"it is exceeded, and --watch only checks it between chunks of pages "
+        f"(default: {document_timeout})",
+    )
+    parser.add_argument(
+        "--page-timeout",
+        type=int,
+        default=page_timeout,
+        help=f"Seconds allowed per page. A worker process is stopped after this "
+        f"many seconds per page of its document, and --watch only limits each "
+        f"chunk of pages (default: {page_timeout})",
+    )
+    parser.add_argument(
+        "--chunk-pages",
+        type=int,
+        default=chunk_pages,
+        help=f"Pages converted at a time in long PDFs (default: {chunk_pages})",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and convert new documents as they are downloaded",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=poll_interval,
+        help=f"With --watch, seconds between folder scans (default: {poll_interval})",
+    )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        default=status_port,
+        help=f"With --watch, local port of the status endpoint, 0 to disable "
+        f"(default: {status_port})",
+    )
+    parser.add_argument(
+        "--retry-quarantined",
+        action="store_true",
+        help="Retry documents quarantined after repeated failures",
+    )
 
     args = parser.parse_args()
 
-    process_documents(args.input, args.output, force_ocr=args.force_ocr)
+    if args.watch and args.first_pages:
+        parser.error("--first-pages cannot be used with --watch")
+    if args.retry_quarantined:
+        Quarantine().release_all()
+
+    backend = DoclingBackend(
+        force_ocr=args.force_ocr,
+        first_pages=args.first_pages,
+        document_timeout=args.document_timeout,
+        page_timeout=args.page_timeout,
+        chunk_pages=args.chunk_pages,
+    )
+    if args.watch:
+        watch_documents(
+            args.input,
+            args.output,
+            backend,
+            use_cache=not args.no_cache,
+            interval=args.poll_interval,
+            port=args.status_port,
+        )
+    else:
+        convert_documents(
+            args.input,
+            args.output,
+            backend,
+            use_cache=not args.no_cache,
+            workers=args.workers,
+            max_memory_mb=args.max_memory_mb,
+            max_tasks_per_worker=args.max_tasks_per_worker,
+        )
+
+    if args.first_pages and not args.no_full_pass:
+        start_full_pass()
@@ -1,7 +1,12 @@
-import csv
 import datetime
+import hashlib
+import json
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
 import requests
 from dateutil import parser
@@ -9,8 +14,43 @@ from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from playwright.sync_api import sync_playwright
 from requests.adapters import HTTPAdapter, Retry
 
+from facetwp_harvester import (
+    HarvestError,
+    harvest_workers,
+    iter_listing_pages,
+    refresh_path,
+)
+from metadata_sinks import open_sink, read_json_lines
+from scrape_manifest import ScrapeManifest, shard_key
+from scrape_metrics import ScrapeMetrics
+
 doc_folder = "data/downloaded_docs/"
 csv_output_file_path = "data/summary/case_metadata.csv"
+# Per-search rows of a sharded crawl before they are merged in order
+shard_spool_folder = "data/summary/shards/"
+
+CSV_FIELDNAMES = [
+    "Title",
+    "Upload Date",
+    "Subject",
+    "Determination",
+    "DR No.",
+    "Determination Doc",
+    "Tribunal",
+    "TR No.",
+    "Tribunal Doc",
+]
+
+site_url = "https://rtb.ie"
+search_path = "/disputes/dispute-outcomes-and-orders/adjudication-and-tribunal-orders/"
+
+# Sizes, hashes and cache validators of downloaded documents
+download_index_path = "data/summary/download_index.json"
+
+# Number of concurrent document downloads
+download_workers = 8
+# Bytes written to disk at a time while downloading
+download_chunk_size = 64 * 1024
 
 # First year of available data
 start_year = 2015
@@ -60,13 +100,17 @@ def get_user_preferences():
     return selected_year, selected_type, download_files
 
 
+# Resource types the listing does not need when running lean
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
 SUPPORTED_CONTENT_TYPES = {
     "application/pdf": ".pdf",
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
 }
 
 
-def download_file(file_link, output_folder, max_retries=2):
+def create_session(max_retries=2, pool_size=10):
+    """Create a requests session with retries and a connection pool."""
     session = requests.Session()
     retry_strategy = Retry(
         total=max_retries,
@@ -74,42 +118,267 @@ def download_file(file_link, output_folder, max_retries=2):
         allowed_methods=["HEAD", "GET"],
         backoff_factor=2,
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
-
-    try:
-        # Check if the file link returns a valid response
-        response = session.head(file_link)
-        content_type = response.headers.get("content-type", "").split(";")[0].strip()
-        if response.status_code != 200:
-            error = (
-                f"Error: Unable to download file.\nStatus Code: {response.status_code}"
-            )
-            print(error)
-            return error
-
-        if content_type not in SUPPORTED_CONTENT_TYPES:
-            error = f"Error: Unsupported content type: {content_type}"
-            print(error)
-            return error
-
-        # Create the output folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True)
-
-        # Download the file to the specified folder
+    return session
+
+
+class DownloadIndex:
+    """Sidecar index of downloaded documents keyed by URL.
+
+    Each entry records the local path, size, SHA-256 and the ETag and
+    Last-Modified validators used to make conditional requests next time.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or download_index_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.unsaved = 0
+        if os.path.exists(self.path):
+            with open(self.path, mode="r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.paths = {entry["path"] for entry in self.entries.values()}
+
+    def get(self, file_link):
+        with self.lock:
+            return self.entries.get(file_link)
+
+    def claim_path(self, file_link, output_folder):
+        """Return the local path for a URL, avoiding other URLs' files"""
+        with self.lock:
+            entry = self.entries.get(file_link)
+            if entry:
+                return entry["path"]
+
+            filename = file_link.split("/")[-1]
+            filepath = os.path.join(output_folder, filename)
+            if filepath in self.paths:
+                # Another URL already uses this filename
+                base_name, extension = os.path.splitext(filename)
+                url_hash = hashlib.sha1(file_link.encode()).hexdigest()[:8]
+                filepath = os.path.join(
+                    output_folder, f"{base_name}-{url_hash}{extension}"
+                )
+
+            # Reserve the path until the download is recorded
+            self.entries[file_link] = {"path": filepath}
+            self.paths.add(filepath)
+            return filepath
+
+    def record(self, file_link, **fields):
+        with self.lock:
+            self.entries.setdefault(file_link, {}).update(fields)
+            self.unsaved += 1
+            if self.unsaved >= 50:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(temp_path, self.path)
+        self.unsaved = 0
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+
+def download_file(
+    file_link,
+    output_folder,
+    max_retries=2,
+    session=None,
+    skip_existing=False,
+    index=None,
+    stats=None,
+):
+    """Download a document to output_folder, returning its path
+
+    The body is streamed to a temporary file and moved into place once
+    complete. With an index, unchanged files are revalidated with a
+    conditional request instead of being downloaded again. If a stats dict
+    is given, the bytes received and retries made are added to it.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("bytes", 0)
+    stats.setdefault("retries", 0)
+    if session is None:
+        session = create_session(max_retries)
+
+    if index is not None:
+        filepath = index.claim_path(file_link, output_folder)
+        entry = index.get(file_link)
+    else:
         filename = file_link.split("/")[-1]
         filepath = os.path.join(output_folder, filename)
+        entry = {}
 
-        # Use requests to download the file
-        response = session.get(file_link)
-        with open(filepath, "wb") as f:
-            f.write(response.content)
+    # Skip files downloaded by a previous run
+    if skip_existing and os.path.exists(filepath):
+        print(f"Skipping existing file: {filepath}")
+        return filepath
+
+    # Ask the server to only send the file if it has changed
+    headers = {}
+    if os.path.exists(filepath):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    temp_path = None
+    try:
+        with session.get(
+            file_link, headers=headers, stream=True, timeout=60
+        ) as response:
+            if response.raw.retries is not None:
+                stats["retries"] += len(response.raw.retries.history)
+
+            if response.status_code == 304:
+                print(f"Unchanged: {filepath}")
+                return filepath
+
+            content_type = (
+                response.headers.get("content-type", "").split(";")[0].strip()
+            )
+            if response.status_code != 200:
+                error = f"Error: Unable to download file.\nStatus Code: {response.status_code}"
+                print(error)
+                return error
+
+            if content_type not in SUPPORTED_CONTENT_TYPES:
+                error = f"Error: Unsupported content type: {content_type}"
+                print(error)
+                return error
+
+            # Create the output folder if it doesn't exist
+            os.makedirs(output_folder, exist_ok=True)
+
+            # Stream the file to disk, hashing it as it arrives
+            sha256 = hashlib.sha256()
+            size = 0
+            temp_path = filepath + ".part"
+            with open(temp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=download_chunk_size):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+            stats["bytes"] += size
+            os.replace(temp_path, filepath)
+            temp_path = None
+
+        if index is not None:
+            index.record(
+                file_link,
+                path=filepath,
+                size=size,
+                sha256=sha256.hexdigest(),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                content_type=content_type,
+            )
 
         return filepath
     except requests.exceptions.RequestException as e:
         print(f"Error downloading file: {e}")
         return None
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class DownloadPool:
+    """Download document files on background threads sharing one session.
+
+    The scraper queues links with submit() and carries on paging while the
+    workers fetch the files. The queue is bounded so a slow server applies
+    back-pressure to the scraper instead of buffering every link in memory.
+    """
+
+    def __init__(self, workers=None, max_retries=2, skip_existing=False, metrics=None):
+        workers = workers or download_workers
+        self.skip_existing = skip_existing
+        self.metrics = metrics
+        self.index = DownloadIndex()
+        self.session = create_session(max_retries, pool_size=workers)
+        self.queue = queue.Queue(maxsize=workers * 4)
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.threads = [
+            threading.Thread(target=self._worker, daemon=True) for _ in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, file_link, output_folder, shard=None):
+        """Queue a file for download, blocking while the queue is full
+
+        shard identifies the search the link came from in the metrics.
+        """
+        self.queue.put((file_link, output_folder, shard))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            file_link, output_folder, shard = item
+            print(f"Downloading file: {file_link}")
+            stats = {}
+            start = time.perf_counter()
+            try:
+                filepath = download_file(
+                    file_link,
+                    output_folder,
+                    session=self.session,
+                    skip_existing=self.skip_existing,
+                    index=self.index,
+                    stats=stats,
+                )
+            except Exception as e:
+                print(f"Error downloading file: {e}")
+                filepath = None
+
+            failed = not filepath or filepath.startswith("Error")
+            with self.lock:
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+            if self.metrics is not None:
+                self.metrics.record_download(
+                    shard,
+                    time.perf_counter() - start,
+                    stats.get("bytes", 0),
+                    stats.get("retries", 0),
+                    failed,
+                )
+            self.queue.task_done()
+
+    def close(self):
+        """Wait for queued downloads to finish and stop the workers"""
+        pending = self.queue.qsize()
+        if pending:
+            print(f"Waiting for {pending} queued downloads to finish...")
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.session.close()
+        self.index.save()
+        print(f"Downloaded {self.completed} files ({self.failed} failed)")
 
 
 def clean_data(data):
@@ -129,34 +398,9 @@ def clean_data(data):
     return cleaned_data
 
 
-def write_to_csv(data):
-    # Clean the data
-    cleaned_data = clean_data(data)
-
-    # Create the output directory if it doesn't exist
-    os.makedirs(os.path.dirname(csv_output_file_path), exist_ok=True)
-
-    # Write data to CSV file
-    with open(csv_output_file_path, mode="w", newline="", encoding="utf-8") as csvfile:
-        fieldnames = [
-            "Title",
-            "Upload Date",
-            "Subject",
-            "Determination",
-            "DR No.",
-            "Determination Doc",
-            "Tribunal",
-            "TR No.",
-            "Tribunal Doc",
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(cleaned_data)
-
-
-def build_search_url(selected_year, order_type):
+def build_search_url(selected_year, order_type, page_number=1):
     """Build search URL based on selected filters"""
-    base_url = "https://rtb.ie/disputes/dispute-outcomes-and-orders/adjudication-and-tribunal-orders/"
+    base_url = site_url + search_path
 
     params = []
 
@@ -165,98 +409,176 @@ def build_search_url(selected_year, order_type):
         params.append(f"_adjudication_orders_and_tribunal_orders_date={selected_year}")
     params.append(f"_adjudication_orders_and_tribunal_orders_post_type={order_type}")
 
+    # Jump straight to a later page when resuming
+    if page_number > 1:
+        params.append(f"_paged={page_number}")
+
     search_url = base_url + "?" + "&".join(params)
     return search_url
 
 
-def extract_search_items(page, download_files=False):
-    """Extract data from all article elements on current page"""
-    data = []
-    print(f"Extracting data from: {page.url}")
+def build_item_data(record, download_pool=None, shard=None):
+    """Convert the raw fields read from a listing article into a result row
 
-    # Find the container with search results using Locator API
-    container = page.locator(
-        'div[data-name="adjudication_orders_and_tribunal_orders_listing"]'
-    )
+    Returns None for articles with neither a title nor a document link.
+    """
+    item_data = {
+        "Determination": False,
+        "Determination Doc": None,
+        "Tribunal": False,
+        "Tribunal Doc": None,
+    }
+
+    item_data["Title"] = record["title"].strip() if record["title"] else None
+    item_data["Subject"] = record["subject"].strip() if record["subject"] else None
+    item_data["DR No."] = record["dr_no"].strip() if record["dr_no"] else None
+    item_data["TR No."] = record["tr_no"].strip() if record["tr_no"] else None
+
+    # Standardise Upload Date
+    if record["time"] is not None:
+        parsed_date = parser.parse(record["time"].strip())
+        item_data["Upload Date"] = parsed_date.strftime("%d/%m/%Y")
+    else:
+        item_data["Upload Date"] = None
+
+    # Classify document links (PDF and DOCX)
+    for href, link_text in record["links"]:
+        link_text = (link_text or "").lower()
+        if href and "determination" in link_text:
+            item_data["Determination"] = True
+            item_data["Determination Doc"] = href
+            if download_pool is not None:
+                download_pool.submit(
+                    href, os.path.join(doc_folder, "determinations"), shard
+                )
+
+        elif href and "tribunal" in link_text:
+            item_data["Tribunal"] = True
+            item_data["Tribunal Doc"] = href
+            if download_pool is not None:
+                download_pool.submit(href, os.path.join(doc_folder, "tribunals"), shard)
+
+    if (
+        item_data.get("Title")
+        or item_data.get("Determination Doc")
+        or item_data.get("Tribunal Doc")
+    ):
+        return item_data
+    return None
+
+
+# Reads every listing article in a single round trip to the browser. The
+# selectors mirror those used by read_article_records_locators.
+ARTICLE_RECORDS_SCRIPT = """
+(container) => {
+    const labelledValue = (article, label) => {
+        for (const span of article.querySelectorAll("span")) {
+            const text = span.textContent.replace(/\\s+/g, " ");
+            if (text.toLowerCase().includes(label.toLowerCase())) {
+                const sibling = span.nextElementSibling;
+                if (sibling && sibling.tagName === "SPAN") {
+                    return sibling.innerText;
+                }
+            }
+        }
+        return null;
+    };
+    return Array.from(container.querySelectorAll("article"), (article) => {
+        const heading = article.querySelector(
+            "h1, h2, h3, h4, h5, h6, [role=heading]"
+        );
+        const time = article.querySelector("time");
+        return {
+            title: heading ? heading.innerText : null,
+            subject: labelledValue(article, "Subject of Dispute"),
+            dr_no: labelledValue(article, "DR No."),
+            tr_no: labelledValue(article, "TR No."),
+            time: time ? time.innerText : null,
+            links: Array.from(article.querySelectorAll("a[href]"), (link) => [
+                link.getAttribute("href"),
+                link.innerText,
+            ]),
+        };
+    });
+}
+"""
+
+
+def read_article_records(container):
+    """Read the raw fields of every article with one page.evaluate call"""
+    return container.evaluate(ARTICLE_RECORDS_SCRIPT)
+
+
+def read_article_records_locators(container):
+    """Read the raw fields of every article one locator at a time"""
+    records = []
 
     # Get all article elements
     articles = container.locator("article").all()
 
     locator_timeout = 10
     for article in articles:
-        item_data = {
-            "Determination": False,
-            "Determination Doc": None,
-            "Tribunal": False,
-            "Tribunal Doc": None,
-        }
+        record = {}
 
         # Extract Title from h3
         heading = article.get_by_role("heading")
         if heading.count() > 0:
-            item_data["Title"] = heading.inner_text(timeout=locator_timeout).strip()
-        else:
-            item_data["Title"] = None
-
-        # Extract Subject
-        subject_span = article.locator('span:has-text("Subject of Dispute") + span')
-        if subject_span.count() > 0:
-            item_data["Subject"] = subject_span.inner_text(
-                timeout=locator_timeout
-            ).strip()
-        else:
-            item_data["Subject"] = None
-
-        # Extract DR No.
-        dr_span = article.locator('span:has-text("DR No.") + span')
-        if dr_span.count() > 0:
-            item_data["DR No."] = dr_span.inner_text(timeout=locator_timeout).strip()
+            record["title"] = heading.inner_text(timeout=locator_timeout)
         else:
-            item_data["DR No."] = None
-
-        # Extract TR No.
-        tr_span = article.locator('span:has-text("TR No.") + span')
-        if tr_span.count() > 0:
-            item_data["TR No."] = tr_span.inner_text(timeout=locator_timeout).strip()
-        else:
-            item_data["TR No."] = None
+            record["title"] = None
+
+        # Extract Subject, DR No. and TR No.
+        for key, label in [
+            ("subject", "Subject of Dispute"),
+            ("dr_no", "DR No."),
+            ("tr_no", "TR No."),
+        ]:
+            span = article.locator(f'span:has-text("{label}") + span')
+            if span.count() > 0:
+                record[key] = span.inner_text(timeout=locator_timeout)
+            else:
+                record[key] = None
 
         # Extract Upload Date
         time_elem = article.get_by_role("time")
         if time_elem.count() > 0:
-            datetime_text = time_elem.inner_text(timeout=locator_timeout).strip()
-            parsed_date = parser.parse(datetime_text)
-            item_data["Upload Date"] = parsed_date.strftime("%d/%m/%Y")
+            record["time"] = time_elem.inner_text(timeout=locator_timeout)
         else:
-            item_data["Upload Date"] = None
+            record["time"] = None
 
         # Extract document links (PDF and DOCX)
-        doc_links = article.locator("a[href]").all()
-
-        for link in doc_links:
-            href = link.get_attribute("href")
-            link_text = link.inner_text().lower()
-            if href and "determination" in link_text:
-                item_data["Determination"] = True
-                item_data["Determination Doc"] = href
-                if download_files:
-                    output_folder = os.path.join(doc_folder, "determinations")
-                    print(f"Downloading file: {href}")
-                    download_file(href, output_folder)
-
-            elif href and "tribunal" in link_text:
-                item_data["Tribunal"] = True
-                item_data["Tribunal Doc"] = href
-                if download_files:
-                    output_folder = os.path.join(doc_folder, "tribunals")
-                    print(f"Downloading file: {href}")
-                    download_file(href, output_folder)
-
-        if (
-            item_data.get("Title")
-            or item_data.get("Determination Doc")
-            or item_data.get("Tribunal Doc")
-        ):
+        record["links"] = [
+            [link.get_attribute("href"), link.inner_text()]
+            for link in article.locator("a[href]").all()
+        ]
+        records.append(record)
+
+    return records
+
+
+def extract_search_items(page, download_pool=None, shard=None):
+    """Extract data from all article elements on current page
+
+    Document links are queued on download_pool, if given, so the page can
+    be left as soon as its fields have been read.
+    """
+    data = []
+    print(f"Extracting data from: {page.url}")
+
+    # Find the container with search results using Locator API
+    container = page.locator(
+        'div[data-name="adjudication_orders_and_tribunal_orders_listing"]'
+    )
+
+    try:
+        records = read_article_records(container)
+    except Exception as e:
+        print(f"Bulk extraction failed, reading articles individually: {e}")
+        records = read_article_records_locators(container)
+
+    for record in records:
+        item_data = build_item_data(record, download_pool, shard)
+        if item_data is not None:
             data.append(item_data)
 
     return data
@@ -272,19 +594,28 @@ def go_to_next_page(page):
     """Navigate to next page by clicking next link"""
     try:
         current_url = page.url
+        next_link = page.locator("a.facetwp-page.next")
+        next_page = next_link.get_attribute("data-page")
+
         # Set up listener for the 'refresh' request
         with page.expect_response(
             lambda response: "refresh" in response.url and response.status == 200,
             timeout=10000,
         ) as response_info:
-            next_link = page.locator("a.facetwp-page.next")
             next_link.click()
 
         response_info.value
 
         page.wait_for_url(lambda url: url != current_url, timeout=10000)
-        page.wait_for_load_state("domcontentloaded")
-        time.sleep(1)
+
+        # Wait for the pager to be re-rendered for the new page
+        if next_page:
+            page.wait_for_selector(
+                f'a.facetwp-page.active[data-page="{next_page}"]', timeout=10000
+            )
+        page.wait_for_selector(
+            ".adjudication-orders-and-tribunal-orders-item", timeout=10000
+        )
 
         return True
     except Exception as e:
@@ -292,12 +623,360 @@ def go_to_next_page(page):
         return False
 
 
-def get_search_results():
-    """Main function to scrape RTB website"""
-    results = []
+class CrawlState:
+    """Output and progress shared by every search in a crawl
+
+    Rows are streamed to sink as each page is read. In a sharded crawl each
+    search instead appends to its own spool file, and merge_spools() copies
+    them to the sink in shard order once all searches have run, so the
+    output is the same whichever shard finishes first. Methods may be called
+    from several shard threads at once.
+    """
+
+    def __init__(
+        self,
+        manifest,
+        shards,
+        sink,
+        download_pool=None,
+        incremental=False,
+        resume=False,
+        spool=False,
+        metrics=None,
+    ):
+        self.manifest = manifest
+        self.metrics = metrics or ScrapeMetrics([shard_key(*s) for s in shards])
+        self.sink = sink
+        self.download_pool = download_pool
+        self.incremental = incremental
+        self.resume = resume
+        self.spool = spool
+        self.spools = {}
+        self.lock = threading.Lock()
+        self.rows_written = 0
+        self.shard_rows = {shard: 0 for shard in shards}
+        self.progress = {shard: "pending" for shard in shards}
+
+        # Spools left by an interrupted run are only kept when resuming
+        if not resume:
+            for shard in shards:
+                if os.path.exists(self.spool_path(shard)):
+                    os.remove(self.spool_path(shard))
+
+    def spool_path(self, shard):
+        filename = shard_key(*shard).replace("|", "_") + ".jsonl"
+        return os.path.join(shard_spool_folder, filename)
+
+    def shard_sink(self, shard):
+        if not self.spool:
+            return self.sink
+        if shard not in self.spools:
+            self.spools[shard] = open_sink(
+                "jsonl", self.spool_path(shard), CSV_FIELDNAMES, append=True
+            )
+        return self.spools[shard]
+
+    def add_page(
+        self,
+        selected_year,
+        order_type,
+        page_number,
+        data,
+        total_pages=None,
+        timings=None,
+    ):
+        """Record the items from a listing page
+
+        timings holds the navigation_seconds and extraction_seconds spent
+        on the page. Returns False when an incremental crawl has reached
+        orders seen before and paging of this search should stop.
+        """
+        shard = (selected_year, order_type)
+        new_data = self.manifest.filter_new(data)
+        if self.incremental or self.resume:
+            rows = clean_data(new_data)
+        else:
+            rows = clean_data(data)
+
+        with self.lock:
+            # Write results incrementally
+            self.shard_sink(shard).write_rows(rows)
+            self.shard_rows[shard] += len(rows)
+            self.rows_written += len(rows)
+            total = self.rows_written
+            self.progress[shard] = f"page {page_number} of {total_pages or '?'}"
+
+        self.manifest.record_page(selected_year, order_type, page_number, data)
+        self.metrics.record_page(
+            shard_key(selected_year, order_type),
+            page_number,
+            total_pages,
+            len(rows),
+            timings or {},
+        )
+        print(
+            f"[{selected_year} {order_type}] Extracted {len(data)} entries "
+            f"({len(new_data)} new). Total: {total}"
+        )
+        print(self.metrics.progress())
+
+        # Stop once the listing reaches orders seen before
+        if self.incremental and not new_data:
+            print("Reached previously scraped orders.")
+            self.manifest.mark_complete(selected_year, order_type)
+            return False
+        return True
+
+    def finish_shard(self, selected_year, order_type, status="done"):
+        """Mark a search as finished and print progress across all shards"""
+        shard = (selected_year, order_type)
+        with self.lock:
+            self.progress[shard] = status
+            if shard in self.spools:
+                self.spools.pop(shard).close()
+            finished = sum(
+                1
+                for state in self.progress.values()
+                if state in ("done", "failed", "skipped")
+            )
+            rows = self.shard_rows[shard]
+        if status == "failed":
+            self.metrics.add(shard_key(selected_year, order_type), failures=1)
+        # A failed metrics write must not fail a search that succeeded
+        try:
+            self.metrics.save()
+        except OSError as e:
+            print(f"Unable to save metrics: {e}")
+        print(
+            f"[{selected_year} {order_type}] {status} with {rows} entries "
+            f"({finished} of {len(self.progress)} searches finished)"
+        )
+
+    def merge_spools(self):
+        """Copy the spooled rows of each search to the sink in shard order"""
+        for spool in self.spools.values():
+            spool.close()
+        self.spools = {}
+
+        for shard in self.progress:
+            path = self.spool_path(shard)
+            if not os.path.exists(path):
+                continue
+            batch = []
+            for row in read_json_lines(path):
+                batch.append(row)
+                if len(batch) >= 1000:
+                    self.sink.write_rows(batch)
+                    batch = []
+            self.sink.write_rows(batch)
+            os.remove(path)
+
+
+def scrape_search_browser(page, crawl, selected_year, order_type, start_page=1):
+    """Scrape every page of a search by driving the listing in the browser"""
+    shard = shard_key(selected_year, order_type)
+    url = build_search_url(selected_year, order_type, start_page)
+    print(f"Search URL: {url}")
+    navigation_start = time.perf_counter()
+    page.goto(url, wait_until="domcontentloaded")
+
+    try:
+        # wait for result items to be present
+        page.wait_for_selector(
+            ".adjudication-orders-and-tribunal-orders-item",
+            timeout=20000,
+        )
+    except PlaywrightTimeoutError:
+        # no results found, move to next year/order_type
+        print("No results found.")
+        crawl.manifest.mark_complete(selected_year, order_type)
+        return
+
+    # Handle cookie consent if present
+    cookie_button = page.locator("#onetrust-accept-btn-handler")
+    if cookie_button.count() > 0 and cookie_button.is_visible():
+        cookie_button.click()
+        try:
+            cookie_button.wait_for(state="hidden", timeout=5000)
+        except PlaywrightTimeoutError:
+            print("Cookie banner did not close.")
+
+    # get total pages from pager using Locator API
+    last_page_elem = page.locator("a.facetwp-page.last")
+    if last_page_elem.count() > 0:
+        total_pages = int(last_page_elem.inner_text())
+    else:
+        total_pages = 1
+    print(f"Total pages: {total_pages}")
+
+    current_page = start_page
+    navigation_seconds = time.perf_counter() - navigation_start
+    while True:
+        print(f"Processing page {current_page} of {total_pages}")
+
+        # Extract data from current page
+        extraction_start = time.perf_counter()
+        data = extract_search_items(page, crawl.download_pool, shard)
+        timings = {
+            "navigation_seconds": navigation_seconds,
+            "extraction_seconds": time.perf_counter() - extraction_start,
+        }
+        if not crawl.add_page(
+            selected_year, order_type, current_page, data, total_pages, timings
+        ):
+            break
+
+        # Check if there's a next page
+        if has_next_page(page):
+            navigation_start = time.perf_counter()
+            if go_to_next_page(page):
+                navigation_seconds = time.perf_counter() - navigation_start
+                current_page += 1
+            else:
+                crawl.metrics.add(shard, failures=1)
+                break
+        else:
+            print("No more pages for this search.")
+            crawl.manifest.mark_complete(selected_year, order_type)
+            break
+
+
+def scrape_search_http(session, crawl, selected_year, order_type, start_page=1):
+    """Scrape a search through the FacetWP refresh endpoint without a browser
+
+    Returns None once the search is finished, or the page number from which
+    the browser should take over if the endpoint could not be used.
+    """
+    shard = shard_key(selected_year, order_type)
+    refresh_url = site_url + refresh_path
+    print(f"Harvesting: {build_search_url(selected_year, order_type, start_page)}")
+    pages = iter_listing_pages(
+        session, refresh_url, search_path, selected_year, order_type, start_page
+    )
+    try:
+        # Time spent waiting on the endpoint counts as navigation
+        navigation_start = time.perf_counter()
+        for page_number, total_pages, records in pages:
+            navigation_seconds = time.perf_counter() - navigation_start
+            if total_pages == 0:
+                print("No results found.")
+                break
+            print(f"Processing page {page_number} of {total_pages}")
+
+            extraction_start = time.perf_counter()
+            items = [
+                build_item_data(record, crawl.download_pool, shard)
+                for record in records
+            ]
+            data = [item for item in items if item is not None]
+            timings = {
+                "navigation_seconds": navigation_seconds,
+                "extraction_seconds": time.perf_counter() - extraction_start,
+            }
+            if not crawl.add_page(
+                selected_year, order_type, page_number, data, total_pages, timings
+            ):
+                return None
+            navigation_start = time.perf_counter()
+    except HarvestError as e:
+        print(f"Unable to harvest page {e.page_number} without a browser: {e}")
+        crawl.metrics.add(shard, failures=1)
+        return e.page_number
+    finally:
+        pages.close()
+
+    crawl.manifest.mark_complete(selected_year, order_type)
+    return None
+
+
+def block_resources(route):
+    """Abort requests the listing does not need to render its results"""
+    request = route.request
+    host = urlparse(request.url).hostname or ""
+    site_host = urlparse(site_url).hostname
+    first_party = host == site_host or host.endswith("." + site_host)
+
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or not first_party:
+        route.abort()
+    else:
+        route.continue_()
+
+
+def launch_browser(p, lean=False):
+    """Launch Chromium and create a browser context
+
+    lean runs headless and blocks images, media, fonts and third-party
+    requests such as analytics and the cookie banner.
+    """
+    browser = p.chromium.launch(headless=lean)
+    context = browser.new_context(bypass_csp=True, ignore_https_errors=True)
+    if lean:
+        context.route("**/*", block_resources)
+    return browser, context
+
+
+def crawl_shard(
+    crawl, selected_year, order_type, start_page=1, session=None, lean=False
+):
+    """Scrape a single (year, order type) search in its own browser
+
+    Runs on a shard worker thread, so it starts its own Playwright instance.
+    """
+    try:
+        if session is not None:
+            start_page = scrape_search_http(
+                session, crawl, selected_year, order_type, start_page
+            )
+            if start_page is None:
+                crawl.finish_shard(selected_year, order_type)
+                return
+            print("Falling back to the browser.")
+
+        with sync_playwright() as p:
+            browser, context = launch_browser(p, lean)
+            try:
+                page = context.new_page()
+                scrape_search_browser(
+                    page, crawl, selected_year, order_type, start_page
+                )
+            finally:
+                browser.close()
+        crawl.finish_shard(selected_year, order_type)
+    except Exception as e:
+        print(f"[{selected_year} {order_type}] Error during scraping: {e}")
+        crawl.finish_shard(selected_year, order_type, "failed")
+
+
+def get_search_results(
+    incremental=False,
+    resume=False,
+    browserless=False,
+    shards=1,
+    output_format="csv",
+    lean=False,
+    preferences=None,
+):
+    """Main function to scrape RTB website
+
+    incremental stops paging each search at the first page containing no
+    new orders. resume continues each search from its last completed page.
+    Both keep the rows already saved to the metadata CSV. browserless reads
+    the listing from the FacetWP refresh endpoint and only launches the
+    browser for searches the endpoint cannot serve. shards sets how many
+    (year, order type) searches are crawled in parallel. output_format
+    selects the metadata file written (csv, jsonl or sqlite). lean runs the
+    browser headless with unneeded resources blocked. preferences is a
+    (year, order type, download files) tuple as returned by
+    get_user_preferences, which is called if it is not given.
+    """
+    manifest = ScrapeManifest()
+    if not resume:
+        manifest.reset_checkpoints()
 
     # Get user input
-    selected_year, selected_type, download_files = get_user_preferences()
+    if preferences is None:
+        preferences = get_user_preferences()
+    selected_year, selected_type, download_files = preferences
 
     # Disaggregate searches for 'All' years
     if selected_year == "All":
@@ -313,85 +992,161 @@ def get_search_results():
     else:
         order_list = [selected_type]
 
-    with sync_playwright() as p:
-        # Launch browser
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context(bypass_csp=True, ignore_https_errors=True)
-        page = context.new_page()
-        start_time = time.time()
+    shard_list = [(year, order_type) for year in year_list for order_type in order_list]
 
-        try:
-            for year in year_list:
-                selected_year = year
-
-                for order_type in order_list:
-                    url = build_search_url(selected_year, order_type)
-                    print(f"Search URL: {url}")
-                    page.goto(url)
-                    page.wait_for_load_state("domcontentloaded")
-                    time.sleep(1)
-
-                    # Handle cookie consent if present
-                    cookie_button = page.locator("#onetrust-accept-btn-handler")
-                    if cookie_button.count() > 0:
-                        cookie_button.click()
-                        time.sleep(1)
-
-                    try:
-                        # wait for result items to be present
-                        page.wait_for_selector(
-                            ".adjudication-orders-and-tribunal-orders-item",
-                            timeout=20000,
+    metrics = ScrapeMetrics([shard_key(*shard) for shard in shard_list])
+
+    # Download documents in the background while the listing is paged
+    download_pool = (
+        DownloadPool(skip_existing=incremental or resume, metrics=metrics)
+        if download_files
+        else None
+    )
+    sink = open_sink(
+        output_format,
+        csv_output_file_path,
+        CSV_FIELDNAMES,
+        append=incremental or resume,
+    )
+    crawl = CrawlState(
+        manifest,
+        shard_list,
+        sink,
+        download_pool,
+        incremental,
+        resume,
+        spool=shards > 1,
+        metrics=metrics,
+    )
+    session = create_session(pool_size=harvest_workers) if browserless else None
+
+    # Work out where each search starts, skipping completed ones
+    searches = []
+    for selected_year, order_type in shard_list:
+        start_page = 1
+        if resume:
+            start_page = manifest.resume_page(selected_year, order_type)
+            if start_page is None:
+                print(f"Already complete: {selected_year} {order_type}")
+                crawl.finish_shard(selected_year, order_type, "skipped")
+                continue
+        searches.append((selected_year, order_type, start_page))
+
+    start_time = time.time()
+    try:
+        if shards > 1:
+            print(f"Crawling {len(searches)} searches with {shards} workers")
+            with ThreadPoolExecutor(max_workers=shards) as executor:
+                for selected_year, order_type, start_page in searches:
+                    executor.submit(
+                        crawl_shard,
+                        crawl,
+                        selected_year,
+                        order_type,
+                        start_page,
+                        session,
+                        lean,
+                    )
+        else:
+            playwright = None
+            browser = None
+            page = None
+            try:
+                for selected_year, order_type, start_page in searches:
+                    if browserless:
+                        start_page = scrape_search_http(
+                            session, crawl, selected_year, order_type, start_page
                         )
-                    except PlaywrightTimeoutError:
-                        # no results found, move to next year/order_type
-                        print("No results found.")
-                        continue
-
-                    # get total pages from pager using Locator API
-                    last_page_elem = page.locator("a.facetwp-page.last")
-                    if last_page_elem.count() > 0:
-                        total_pages = int(last_page_elem.inner_text())
-                    else:
-                        total_pages = 1
-                    print(f"Total pages: {total_pages}")
-
-                    current_page = 1
-                    while True:
-                        print(f"Processing page {current_page} of {total_pages}")
-
-                        # Extract data from current page
-                        data = extract_search_items(page, download_files)
-                        results.extend(data)
-
-                        # Write results incrementally
-                        write_to_csv(results)
-                        print(f"Extracted {len(data)} entries. Total: {len(results)}")
-
-                        # Check if there's a next page
-                        if has_next_page(page):
-                            if go_to_next_page(page):
-                                current_page += 1
-                            else:
-                                break
-                        else:
-                            print("No more pages for this search.")
-                            break
-
-        except Exception as e:
-            print(f"Error during scraping: {e}")
-
-        finally:
-            print(f"Total entries scraped: {len(results)}")
-            browser.close()
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            print(
-                f"Finished in: {elapsed_time:.2f} seconds ({elapsed_time / 60:.2f} minutes)"
-            )
+                        if start_page is None:
+                            crawl.finish_shard(selected_year, order_type)
+                            continue
+                        print("Falling back to the browser.")
+
+                    # Start Playwright and launch the browser when first needed
+                    if page is None:
+                        playwright = sync_playwright().start()
+                        browser, context = launch_browser(playwright, lean)
+                        page = context.new_page()
+
+                    scrape_search_browser(
+                        page, crawl, selected_year, order_type, start_page
+                    )
+                    crawl.finish_shard(selected_year, order_type)
+            finally:
+                if browser is not None:
+                    browser.close()
+                if playwright is not None:
+                    playwright.stop()
 
-    print(f"Results saved to: {csv_output_file_path}")
+    except Exception as e:
+        print(f"Error during scraping: {e}")
+
+    finally:
+        crawl.merge_spools()
+        sink.close()
+        print(f"Total entries scraped: {crawl.rows_written}")
+        if download_pool is not None:
+            download_pool.close()
+        if session is not None:
+            session.close()
+        manifest.close()
+        metrics.save()
+        print(f"Metrics saved to: {metrics.path}")
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+        print(
+            f"Finished in: {elapsed_time:.2f} seconds ({elapsed_time / 60:.2f} minutes)"
+        )
+
+    print(f"Results saved to: {sink.path}")
 
 
 if __name__ == "__main__":
-    get_search_results()
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Download RTB adjudication and tribunal orders."
+    )
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Stop each search at the first page with no new orders",
+    )
+    arg_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue each search from the last completed page",
+    )
+    arg_parser.add_argument(
+        "--browserless",
+        action="store_true",
+        help="Read the listing over HTTP, using the browser only as a fallback",
+    )
+    arg_parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of (year, order type) searches to crawl in parallel",
+    )
+    arg_parser.add_argument(
+        "--output-format",
+        choices=["csv", "jsonl", "sqlite"],
+        default="csv",
+        help="Format of the case metadata file (default: csv)",
+    )
+    arg_parser.add_argument(
+        "--lean",
+        action="store_true",
+        help="Run the browser headless and block images, fonts and third-party requests",
+    )
+
+    args = arg_parser.parse_args()
+
+    get_search_results(
+        incremental=args.incremental,
+        resume=args.resume,
+        browserless=args.browserless,
+        shards=args.shards,
+        output_format=args.output_format,
+        lean=args.lean,
+    )
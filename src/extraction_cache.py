@@ -0,0 +1,54 @@
+import json
+import os
+
+extraction_cache_path = "data/summary/extraction_cache.json"
+
+# Text files extracted between saves of the cache
+save_every = 50
+
+
+class ExtractionCache:
+    """Details extracted from each text file, keyed by path.
+
+    Entries record the sha256 of the text and the extractor version along
+    with the details, so callers can tell whether they are still current.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or extraction_cache_path
+        self.entries = {}
+        self.unsaved = 0
+        if os.path.exists(self.path):
+            with open(self.path, mode="r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, file_path):
+        return self.entries.get(file_path)
+
+    def record(self, file_path, entry):
+        self.entries[file_path] = entry
+        self.unsaved += 1
+        if self.unsaved >= save_every:
+            self.save()
+
+    def prune(self, input_folder, file_paths):
+        """Forget files removed from input_folder.
+
+        Entries for files in other folders are kept, so corpora extracted
+        separately can share the cache.
+        """
+        root = os.path.abspath(input_folder)
+        keep = set(file_paths)
+        for file_path in list(self.entries):
+            if file_path in keep:
+                continue
+            if os.path.commonpath([root, os.path.abspath(file_path)]) == root:
+                del self.entries[file_path]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(temp_path, self.path)
+        self.unsaved = 0
@@ -0,0 +1,248 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+import requests
+
+# FacetWP REST route used by the listing page to refresh its results
+refresh_path = "/wp-json/facetwp/v1/refresh"
+listing_template = "adjudication_orders_and_tribunal_orders_listing"
+date_facet = "adjudication_orders_and_tribunal_orders_date"
+type_facet = "adjudication_orders_and_tribunal_orders_post_type"
+
+# Number of listing pages requested concurrently
+harvest_workers = 4
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+
+
+class HarvestError(Exception):
+    """Raised when a listing page cannot be harvested without a browser"""
+
+    def __init__(self, page_number, message):
+        super().__init__(message)
+        self.page_number = page_number
+
+
+class Node:
+    """Minimal HTML element tree node"""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.children = []
+
+    def iter(self, tag=None):
+        """Yield descendant elements in document order"""
+        for child in self.children:
+            if isinstance(child, Node):
+                if tag is None or child.tag == tag:
+                    yield child
+                yield from child.iter(tag)
+
+    def text(self):
+        """Return the text content with whitespace collapsed"""
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return " ".join("".join(parts).split())
+
+    def next_element_sibling(self):
+        if self.parent is None:
+            return None
+        siblings = [child for child in self.parent.children if isinstance(child, Node)]
+        index = siblings.index(self)
+        return siblings[index + 1] if index + 1 < len(siblings) else None
+
+
+class TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.root = Node("document", [])
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        # Close the nearest open element with this tag, ignoring stray tags
+        node = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def labelled_value(article, label):
+    """Return the text of the span following the span containing label"""
+    for span in article.iter("span"):
+        if label.lower() in span.text().lower():
+            sibling = span.next_element_sibling()
+            if sibling is not None and sibling.tag == "span":
+                return sibling.text()
+    return None
+
+
+def article_record(article):
+    """Read the raw fields of a listing article"""
+    headings = [
+        node
+        for node in article.iter()
+        if node.tag in HEADING_TAGS or node.attrs.get("role") == "heading"
+    ]
+    time_elems = list(article.iter("time"))
+
+    return {
+        "title": headings[0].text() if headings else None,
+        "subject": labelled_value(article, "Subject of Dispute"),
+        "dr_no": labelled_value(article, "DR No."),
+        "tr_no": labelled_value(article, "TR No."),
+        "time": time_elems[0].text() if time_elems else None,
+        "links": [
+            [link.attrs.get("href"), link.text()]
+            for link in article.iter("a")
+            if "href" in link.attrs
+        ],
+    }
+
+
+def parse_listing(html):
+    """Parse the article records from a listing template fragment"""
+    root = parse_html(html)
+    return [article_record(article) for article in root.iter("article")]
+
+
+def build_refresh_payload(selected_year, order_type, uri, page_number=1):
+    """Build the request body FacetWP sends when the listing is refreshed"""
+    facets = {
+        date_facet: [] if selected_year == "All" else [str(selected_year)],
+        type_facet: order_type.split("|"),
+    }
+    return {
+        "action": "facetwp_refresh",
+        "data": {
+            "facets": facets,
+            "frozen_facets": {},
+            "http_params": {"get": {}, "uri": uri.strip("/"), "url_vars": facets},
+            "template": listing_template,
+            "extras": {"sort": "default"},
+            "soft_refresh": 0,
+            "is_bfcache": 1,
+            "first_load": 0,
+            "paged": page_number,
+        },
+    }
+
+
+def fetch_listing_page(
+    session, refresh_url, uri, selected_year, order_type, page_number, timeout=30
+):
+    """Request a listing page from the refresh endpoint and parse its records"""
+    payload = build_refresh_payload(selected_year, order_type, uri, page_number)
+    try:
+        response = session.post(refresh_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise HarvestError(page_number, f"Refresh request failed: {e}")
+
+    template = data.get("template") if isinstance(data, dict) else None
+    if not isinstance(template, str):
+        raise HarvestError(page_number, "Refresh response has no listing template")
+
+    pager = data.get("settings", {}).get("pager", {})
+    total_rows = int(pager.get("total_rows") or 0)
+    records = parse_listing(template)
+
+    # An empty template for a non-empty result set means the markup changed
+    if total_rows and not records:
+        raise HarvestError(page_number, "No articles found in listing template")
+
+    return {
+        "records": records,
+        "total_pages": int(pager.get("total_pages") or 0),
+        "total_rows": total_rows,
+    }
+
+
+def iter_listing_pages(
+    session,
+    refresh_url,
+    uri,
+    selected_year,
+    order_type,
+    start_page=1,
+    workers=harvest_workers,
+):
+    """Yield (page number, total pages, records) for each page of a search
+
+    The first page is fetched alone to learn the page count, after which up
+    to workers pages are requested ahead of the consumer. Pages are always
+    yielded in order so the caller can stop early without gaps.
+    """
+    first = fetch_listing_page(
+        session, refresh_url, uri, selected_year, order_type, start_page
+    )
+    total_pages = first["total_pages"]
+    yield start_page, total_pages, first["records"]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_page = start_page + 1
+        try:
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < workers:
+                    future = executor.submit(
+                        fetch_listing_page,
+                        session,
+                        refresh_url,
+                        uri,
+                        selected_year,
+                        order_type,
+                        next_page,
+                    )
+                    pending.append((next_page, future))
+                    next_page += 1
+
+                page_number, future = pending.popleft()
+                yield page_number, total_pages, future.result()["records"]
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,74 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+# Most pages read in header mode before giving up on the anchors
+header_page_limit = 10
+
+full_pass_log_path = "data/summary/full_conversion.log"
+
+# Text the extraction stage looks for in the opening section of an order
+HEADER_ANCHORS = [
+    re.compile(r"In the matter of", re.IGNORECASE),
+    re.compile(r"residential tenancies board on|determination made on", re.IGNORECASE),
+]
+
+
+def has_header(text):
+    """Return True if text contains every anchor used by the extraction stage"""
+    return all(anchor.search(text) for anchor in HEADER_ANCHORS)
+
+
+def iter_header_pages(pages, first_pages):
+    """Yield the first pages of a document, extending until the anchors appear
+
+    pages is an iterable of page texts. No more than header_page_limit
+    pages are read.
+    """
+    text = ""
+    for page_number, txt in enumerate(pages, start=1):
+        yield txt
+        text += txt
+        if page_number >= first_pages and (
+            has_header(text) or page_number >= header_page_limit
+        ):
+            return
+
+
+def start_full_pass():
+    """Re-run the current script on all pages as a low-priority background job
+
+    The command line is repeated without --first-pages, and the job's output
+    is appended to full_pass_log_path.
+    """
+    args = []
+    skip_value = False
+    for arg in sys.argv[1:]:
+        if skip_value:
+            skip_value = False
+        elif arg == "--first-pages":
+            skip_value = True
+        elif not arg.startswith("--first-pages="):
+            args.append(arg)
+
+    # Lowered with nice rather than preexec_fn, which can deadlock the
+    # child of a process that already runs model threads
+    command = [sys.executable, sys.argv[0], *args]
+    if shutil.which("nice"):
+        command = ["nice", "-n", "19", *command]
+
+    os.makedirs(os.path.dirname(full_pass_log_path), exist_ok=True)
+    with open(full_pass_log_path, mode="a", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            command,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    print(
+        f"Full conversion running in the background (pid {process.pid}), "
+        f"logging to {full_pass_log_path}"
+    )
+    return process
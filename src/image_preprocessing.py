@@ -0,0 +1,163 @@
+import numpy as np
+from PIL import Image
+
+# Resolution pages are rasterized at before OCR
+render_dpi = 200
+
+# Pages are downscaled towards target_dpi while lines of text stay at least
+# min_line_height pixels high
+target_dpi = 150
+min_line_height = 20
+
+# Largest skew corrected and the step between the angles tried, in degrees
+max_skew = 3.0
+skew_step = 0.1
+
+# Ink pixels sampled when estimating the skew
+skew_samples = 20000
+
+# White space kept around the text when cropping margins, in pixels
+crop_padding = 10
+
+
+def to_grayscale(image):
+    """Return a page image as a 2D uint8 array, 0 black and 255 white"""
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    pixels = np.asarray(image, dtype=np.float32)
+    if pixels.ndim == 3:
+        pixels = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return np.rint(pixels).astype(np.uint8)
+
+
+def otsu_threshold(gray):
+    """Return the grey level that best separates ink from paper"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    ink_pixels = np.cumsum(histogram)
+    ink_sum = np.cumsum(histogram * np.arange(256))
+    total = ink_pixels[-1]
+    paper_pixels = total - ink_pixels
+
+    # Between-class variance for each threshold, up to a constant factor
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (ink_sum[-1] * ink_pixels - total * ink_sum) ** 2 / (
+            ink_pixels * paper_pixels
+        )
+    return int(np.argmax(np.nan_to_num(variance, nan=0.0, posinf=0.0)))
+
+
+def estimate_skew(ink):
+    """Return the rotation in degrees that makes lines of text horizontal.
+
+    Ink pixels are projected onto the vertical axis at each candidate
+    angle. The angle whose profile is most sharply peaked wins.
+    """
+    rows, cols = np.nonzero(ink)
+    if len(rows) < 100:
+        return 0.0
+    if len(rows) > skew_samples:
+        sample = np.random.default_rng(0).choice(len(rows), skew_samples, replace=False)
+        rows, cols = rows[sample], cols[sample]
+
+    angles = np.arange(-max_skew, max_skew + skew_step / 2, skew_step)
+    radians = np.deg2rad(angles)[:, None]
+    # Row of every pixel after rotating by each angle, one line per angle
+    projected = rows * np.cos(radians) - cols * np.sin(radians)
+    projected = np.rint(projected - projected.min(axis=1, keepdims=True))
+    projected = projected.astype(np.int64)
+    height = projected.max() + 1
+    offsets = (np.arange(len(angles)) * height)[:, None]
+    profiles = np.bincount(
+        (projected + offsets).ravel(), minlength=len(angles) * height
+    ).reshape(len(angles), height)
+
+    scores = (profiles.astype(np.float64) ** 2).sum(axis=1)
+    return round(float(angles[np.argmax(scores)]), 2)
+
+
+def text_bounds(ink):
+    """Return (top, bottom, left, right) around the text, or None if blank.
+
+    Rows and columns that are mostly ink, like the dark edges of a scan,
+    count as margin, as do those with a single speck.
+    """
+
+    def span(counts, length):
+        content = np.flatnonzero((counts >= 2) & (counts < length / 2))
+        if not len(content):
+            return None
+        return (
+            max(content[0] - crop_padding, 0),
+            min(content[-1] + crop_padding + 1, len(counts)),
+        )
+
+    columns = span(ink.sum(axis=0), ink.shape[0])
+    if columns is None:
+        return None
+    left, right = columns
+    rows = span(ink[:, left:right].sum(axis=1), right - left)
+    if rows is None:
+        return None
+    top, bottom = rows
+    return top, bottom, left, right
+
+
+def line_height(ink):
+    """Return the median height of the lines of text in pixels, or None.
+
+    Only the middle half of the page is used, clear of any dark scan edges.
+    """
+    width = ink.shape[1]
+    middle = ink[:, width // 4 : width - width // 4]
+    has_ink = np.concatenate(([0], middle.any(axis=1).astype(np.int8), [0]))
+    edges = np.diff(has_ink)
+    heights = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    heights = heights[heights >= 3]
+    return float(np.median(heights)) if len(heights) else None
+
+
+def downscale_factor(ink, dpi):
+    scale = target_dpi / dpi
+    height = line_height(ink)
+    if height:
+        scale = max(scale, min_line_height / height)
+    return min(scale, 1.0)
+
+
+def preprocess_page(image, dpi=None):
+    """Clean up a rasterized page so tesseract reads it faster.
+
+    The page is converted to greyscale, deskewed, cropped to its text,
+    downscaled and binarized. Returns the page as a PIL image and its
+    resolution after scaling, which should be passed on to tesseract.
+    """
+    dpi = dpi or render_dpi
+    gray = to_grayscale(image)
+    threshold = otsu_threshold(gray)
+    ink = gray <= threshold
+
+    angle = estimate_skew(ink)
+    if angle:
+        rotated = Image.fromarray(gray).rotate(
+            angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255
+        )
+        gray = np.asarray(rotated)
+        ink = gray <= threshold
+
+    bounds = text_bounds(ink)
+    if bounds:
+        top, bottom, left, right = bounds
+        gray = gray[top:bottom, left:right]
+        ink = ink[top:bottom, left:right]
+
+    scale = downscale_factor(ink, dpi)
+    page = Image.fromarray(gray)
+    if scale < 1:
+        page = page.resize(
+            (max(round(page.width * scale), 1), max(round(page.height * scale), 1)),
+            Image.Resampling.LANCZOS,
+        )
+        gray = np.asarray(page)
+
+    binary = np.where(gray <= otsu_threshold(gray), 0, 255).astype(np.uint8)
+    return Image.fromarray(binary), round(dpi * scale)
@@ -0,0 +1,36 @@
+import resource
+
+
+def read_status_mb(field, pid="self"):
+    """Return a memory field of /proc/<pid>/status in MB, or None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/status", mode="r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def resident_memory_mb(pid):
+    """Current resident memory of a process, or None where /proc is missing"""
+    return read_status_mb("VmRSS", pid)
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process.
+
+    Read from VmHWM, which starts afresh in each new process. ru_maxrss,
+    the fallback where /proc is missing, also counts the parent's peak.
+    Child processes are not included.
+    """
+    peak = read_status_mb("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return peak
+
+
+def peak_child_memory_mb():
+    """Peak resident memory of the largest finished child process, e.g. tesseract"""
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
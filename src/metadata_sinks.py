@@ -0,0 +1,205 @@
+import csv
+import json
+import os
+import sqlite3
+
+from scrape_manifest import order_keys
+
+# Rows written between forced flushes to disk
+checkpoint_rows = 500
+
+
+def row_key(row):
+    """Identify a row by its order numbers and document URLs"""
+    return tuple(order_keys(row))
+
+
+def truncate_partial_line(path):
+    """Drop a partially written last line left behind by a crash"""
+    with open(path, mode="rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        # Walk back to the last complete line
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            index = f.read(step).rfind(b"\n")
+            if index != -1:
+                f.truncate(position + index + 1)
+                return
+        f.truncate(0)
+
+
+class MetadataSink:
+    """Append-only destination for scraped rows.
+
+    Rows are written as they arrive and flushed to disk every
+    checkpoint_rows rows, so memory stays flat however long the crawl.
+    append keeps rows already in the output instead of starting afresh,
+    and skips rows for orders that are already there, e.g. from a page
+    written just before a crash and read again on resume.
+    """
+
+    def __init__(self, path, fieldnames, append=False):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.append = append
+        self.rows_written = 0
+        self.unsaved_rows = 0
+        self.existing = set()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def load_existing(self, rows):
+        """Remember the orders already in the output"""
+        self.existing = {key for key in map(row_key, rows) if key}
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if self.existing:
+            rows = [row for row in rows if row_key(row) not in self.existing]
+        if not rows:
+            return
+        self._write(rows)
+        self.rows_written += len(rows)
+        self.unsaved_rows += len(rows)
+        if self.unsaved_rows >= checkpoint_rows:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Make the rows written so far durable"""
+        self.unsaved_rows = 0
+
+    def close(self):
+        self.checkpoint()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(MetadataSink):
+    def __init__(self, path, fieldnames, append=False):
+        super().__init__(path, fieldnames, append)
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            truncate_partial_line(path)
+            with open(path, mode="r", newline="", encoding="utf-8") as f:
+                self.load_existing(csv.DictReader(f))
+        self.file = open(
+            path, mode="a" if exists else "w", newline="", encoding="utf-8"
+        )
+        self.writer = csv.DictWriter(
+            self.file, fieldnames=fieldnames, extrasaction="ignore"
+        )
+        if not exists:
+            self.writer.writeheader()
+
+    def _write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        super().checkpoint()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class JsonLinesSink(MetadataSink):
+    def __init__(self, path, fieldnames, append=False):
+        super().__init__(path, fieldnames, append)
+        exists = append and os.path.exists(path)
+        if exists:
+            truncate_partial_line(path)
+            self.load_existing(read_json_lines(path))
+        self.file = open(path, mode="a" if exists else "w", encoding="utf-8")
+
+    def _write(self, rows):
+        for row in rows:
+            record = {key: row.get(key) for key in self.fieldnames}
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        super().checkpoint()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class SqliteSink(MetadataSink):
+    """Rows are committed in one transaction per checkpoint"""
+
+    table = "case_metadata"
+
+    def __init__(self, path, fieldnames, append=False):
+        super().__init__(path, fieldnames, append)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(f'"{name}"' for name in fieldnames)
+        if not append:
+            self.connection.execute(f"DROP TABLE IF EXISTS {self.table}")
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({columns})")
+        self.connection.commit()
+        if append:
+            cursor = self.connection.execute(f"SELECT {columns} FROM {self.table}")
+            self.load_existing(dict(zip(fieldnames, values)) for values in cursor)
+        placeholders = ", ".join("?" for _ in fieldnames)
+        self.insert_sql = (
+            f"INSERT INTO {self.table} ({columns}) VALUES ({placeholders})"
+        )
+
+    def _write(self, rows):
+        self.connection.executemany(
+            self.insert_sql,
+            [[row.get(name) for name in self.fieldnames] for row in rows],
+        )
+
+    def checkpoint(self):
+        self.connection.commit()
+        super().checkpoint()
+
+    def close(self):
+        super().close()
+        self.connection.close()
+
+
+SINKS = {
+    "csv": (CsvSink, ".csv"),
+    "jsonl": (JsonLinesSink, ".jsonl"),
+    "sqlite": (SqliteSink, ".sqlite"),
+}
+
+
+def open_sink(output_format, path, fieldnames, append=False):
+    """Open a sink of the given format, replacing the extension of path"""
+    if output_format not in SINKS:
+        raise ValueError(
+            f"Unsupported output format. Choose one of: {', '.join(SINKS)}"
+        )
+    sink_class, extension = SINKS[output_format]
+    path = os.path.splitext(path)[0] + extension
+    return sink_class(path, fieldnames, append)
+
+
+def read_json_lines(path):
+    """Yield the rows of a JSON Lines file one at a time"""
+    with open(path, mode="r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
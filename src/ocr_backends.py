@@ -0,0 +1,245 @@
+from abc import ABC, abstractmethod
+
+from header_pages import header_page_limit
+from utilities.count_text_pdfs import PdfIndex
+
+
+class OcrBackend(ABC):
+    """Converts documents to text.
+
+    Subclasses set name and the file extensions they accept, and implement
+    load() to import and initialise their engine and convert() to yield
+    the text of one document. Engines are imported in load(), so only the
+    dependencies of the backends in use need to be installed. After each
+    conversion, route describes how the document was read.
+
+    options holds the constructor arguments, so worker processes can build
+    the same backend with type(backend)(**backend.options). Backends with
+    run_in_worker set always convert in worker processes, so a document
+    that runs past time_limit() can be stopped.
+    """
+
+    name = None
+    extensions = {".pdf"}
+    run_in_worker = False
+
+    def __init__(self, **options):
+        self.options = options
+        self.loaded = False
+        self.index = None
+        self.route = None
+
+    @property
+    def settings(self):
+        """Settings identifying this backend's output, for the conversion cache"""
+        return {"converter": self.name, **self.options}
+
+    def load(self):
+        self.loaded = True
+
+    def prepare(self, file_paths, workers=None):
+        """Classify the PDFs about to be converted, reusing the PDF index.
+
+        workers is passed to PdfIndex.update. With workers=1 the files are
+        classified in this process.
+        """
+        if self.index is None:
+            self.index = PdfIndex()
+        self.index.update(
+            [path for path in file_paths if path.lower().endswith(".pdf")], workers
+        )
+
+    def time_limit(self, file_path):
+        """Seconds a worker may spend on a document before it is stopped"""
+        return None
+
+    @abstractmethod
+    def convert(self, file_path):
+        """Yield the text of a document in chunks and set route"""
+
+    def iter_text(self, file_path):
+        if not self.loaded:
+            self.load()
+        return self.convert(file_path)
+
+    def convert_file(self, file_path):
+        return "".join(self.iter_text(file_path))
+
+
+class TesseractBackend(OcrBackend):
+    """pdf2image and pytesseract, page by page (see pdf2text).
+
+    Pages with a text layer are read directly unless force_ocr is set. With
+    preprocess, page images are cleaned up and downscaled before OCR.
+    first_pages reads only the opening pages that hold the order's details.
+    """
+
+    name = "tesseract"
+
+    def __init__(
+        self,
+        force_ocr=False,
+        ocr_workers=None,
+        preprocess=False,
+        page_numbers=False,
+        first_pages=None,
+        page_timeout=None,
+        document_timeout=None,
+    ):
+        super().__init__(
+            force_ocr=force_ocr,
+            ocr_workers=ocr_workers,
+            preprocess=preprocess,
+            page_numbers=page_numbers,
+            first_pages=first_pages,
+            page_timeout=page_timeout,
+            document_timeout=document_timeout,
+        )
+
+    @property
+    def settings(self):
+        settings = {
+            "converter": "pdf2text",
+            "page_numbers": self.options["page_numbers"],
+            "force_ocr": self.options["force_ocr"],
+            "first_pages": self.options["first_pages"],
+        }
+        # Only recorded when enabled, so earlier outputs stay current
+        if self.options["preprocess"]:
+            settings["preprocess"] = True
+        return settings
+
+    def load(self):
+        import pdf2text
+
+        for limit in ["page_timeout", "document_timeout"]:
+            if self.options[limit]:
+                setattr(pdf2text, limit, self.options[limit])
+        self.pdf2text = pdf2text
+        super().load()
+
+    def prepare(self, file_paths, workers=None):
+        if not self.options["force_ocr"]:
+            super().prepare(file_paths, workers)
+
+    def convert(self, file_path):
+        self.route, pages = self.pdf2text.route_pages(
+            file_path, self.options["force_ocr"], self.index
+        )
+        pages = self.pdf2text.iter_pages(
+            file_path,
+            pages,
+            self.options["ocr_workers"],
+            preprocess=self.options["preprocess"],
+        )
+        yield from self.pdf2text.iter_text(
+            pages, self.options["page_numbers"], self.options["first_pages"]
+        )
+
+
+class TextLayerBackend(OcrBackend):
+    """Embedded text only, read with poppler's pdftotext and no OCR"""
+
+    name = "text-layer"
+
+    def load(self):
+        import pdf2text
+
+        self.pdf2text = pdf2text
+        super().load()
+
+    def prepare(self, file_paths, workers=None):
+        pass
+
+    def convert(self, file_path):
+        self.route = "text layer"
+        yield from self.pdf2text.iter_text(self.pdf2text.extract_text_layer(file_path))
+
+
+class DoclingBackend(OcrBackend):
+    """docling with EasyOCR (see docling_ocr).
+
+    Documents with a text layer are read without OCR, and converted again
+    with OCR if that yields no text. first_pages reads only the opening
+    pages that hold the order's details.
+    """
+
+    name = "docling"
+    extensions = {".pdf", ".docx"}
+    run_in_worker = True
+
+    def __init__(
+        self,
+        force_ocr=False,
+        first_pages=None,
+        document_timeout=None,
+        page_timeout=None,
+        chunk_pages=None,
+    ):
+        super().__init__(
+            force_ocr=force_ocr,
+            first_pages=first_pages,
+            document_timeout=document_timeout,
+            page_timeout=page_timeout,
+            chunk_pages=chunk_pages,
+        )
+        self.converters = {}
+
+    @property
+    def settings(self):
+        return {
+            "converter": "docling",
+            "force_ocr": self.options["force_ocr"],
+            "first_pages": self.options["first_pages"],
+        }
+
+    def load(self):
+        import docling_ocr
+
+        for limit in ["document_timeout", "page_timeout", "chunk_pages"]:
+            if self.options[limit]:
+                setattr(docling_ocr, limit, self.options[limit])
+        self.docling_ocr = docling_ocr
+
+        # Most documents are born-digital, so warm the text layer converter
+        force_ocr = self.options["force_ocr"]
+        docling_ocr.get_converter(
+            self.converters, "ocr" if force_ocr else "text", force_ocr
+        )
+        super().load()
+
+    def time_limit(self, file_path):
+        """page_timeout for each page to convert, up to document_timeout"""
+        docling_ocr = self.docling_ocr
+        page_count = docling_ocr.page_count_of(file_path, self.index)
+        if not page_count:
+            return docling_ocr.document_timeout
+        if self.options["first_pages"]:
+            page_count = min(page_count, header_page_limit)
+        return min(docling_ocr.document_timeout, docling_ocr.page_timeout * page_count)
+
+    def convert(self, file_path):
+        route, text_content = self.docling_ocr.convert_document(
+            file_path,
+            self.converters,
+            self.options["force_ocr"],
+            self.index,
+            self.options["first_pages"],
+        )
+        self.route = self.docling_ocr.ROUTE_LABELS[route]
+        yield text_content
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in [TesseractBackend, TextLayerBackend, DoclingBackend]
+}
+
+
+def get_backend(name, **options):
+    """Create a backend by name, passing options to its constructor"""
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend {name!r}. Choose one of: {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[name](**options)
@@ -0,0 +1,315 @@
+import json
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from memory_usage import peak_child_memory_mb, peak_memory_mb
+from ocr_backends import get_backend
+
+corpus_folder = "data/benchmark/corpus/"
+benchmark_output_path = "data/summary/ocr_benchmark.json"
+
+# Backend and options of each configuration benchmarked. tesseract forces
+# OCR so text-native PDFs are not read from their text layer instead.
+BENCHMARK_CONFIGS = {
+    "tesseract": ("tesseract", {"force_ocr": True}),
+    "tesseract-preprocessed": ("tesseract", {"force_ocr": True, "preprocess": True}),
+    "text-layer": ("text-layer", {}),
+    "docling": ("docling", {}),
+}
+
+DOCUMENT_TYPES = ["text", "scanned"]
+
+WORDS = (
+    "the tenancy landlord tenant dwelling rent arrears deposit notice of "
+    "termination board adjudicator tribunal hearing order determination "
+    "dispute parties residential tenancies act section property months "
+    "payment balance retained repairs breach obligations evidence submitted "
+    "agreed amount sum euro within days date appeal respondent applicant "
+    "valid invalid served period lease behaviour standard maintenance"
+).split()
+
+NAMES = ["Mary Byrne", "John Murphy", "Aoife Kelly", "Sean Walsh", "Ciara Ryan"]
+STREETS = ["Main Street", "Church Road", "Park Avenue", "Green Lane"]
+TOWNS = ["Dublin 8", "Cork", "Galway", "Limerick", "Co. Kildare"]
+
+
+def make_document(rng, pages, lines_per_page=40, line_length=75):
+    """Return the lines of each page of a synthetic determination order"""
+    tenant, landlord = rng.sample(NAMES, 2)
+    address = f"{rng.randint(1, 99)} {rng.choice(STREETS)}, {rng.choice(TOWNS)}"
+    header = [
+        "Residential Tenancies Board",
+        f"In the matter of {tenant} (Applicant Tenant) and {landlord} "
+        "(Respondent Landlord)",
+        f"relating to the tenancy of {address}.",
+        f"Determination made on {rng.randint(1, 28)} March {rng.randint(2015, 2024)}.",
+        "",
+    ]
+
+    document = []
+    for page_number in range(pages):
+        lines = list(header) if page_number == 0 else []
+        while len(lines) < lines_per_page:
+            line = rng.choice(WORDS).capitalize()
+            while len(line) < line_length - 12:
+                line += " " + rng.choice(WORDS)
+            lines.append(line + ".")
+        document.append(lines)
+    return document
+
+
+def pdf_string(text):
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"({escaped})"
+
+
+def write_text_pdf(path, pages, font_size=11, leading=15):
+    """Write a born-digital PDF with one Helvetica text block per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+    for lines in pages:
+        content = f"BT /F1 {font_size} Tf {leading} TL 72 740 Td\n"
+        content += "".join(f"{pdf_string(line)} Tj T*\n" for line in lines)
+        content += "ET"
+        content = content.encode("latin-1")
+        objects.append(
+            f"<< /Length {len(content)} >>\nstream\n".encode()
+            + content
+            + b"\nendstream"
+        )
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode()
+        )
+        page_numbers.append(len(objects))
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode()
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def rasterize_pdf(text_pdf_path, scanned_pdf_path, rng, dpi=200):
+    """Render a PDF to greyscale page images, slightly skewed like a scan"""
+    from pdf2image import convert_from_path
+
+    images = [
+        image.convert("L").rotate(rng.uniform(-1.5, 1.5), expand=True, fillcolor=255)
+        for image in convert_from_path(text_pdf_path, dpi=dpi)
+    ]
+    images[0].save(
+        scanned_pdf_path, save_all=True, append_images=images[1:], resolution=dpi
+    )
+
+
+def generate_corpus(folder=None, documents=10, pages=3, seed=0):
+    """Write text-native and scanned PDFs with their ground truth text"""
+    folder = folder or corpus_folder
+    rng = random.Random(seed)
+    for subfolder in [*DOCUMENT_TYPES, "truth"]:
+        os.makedirs(os.path.join(folder, subfolder), exist_ok=True)
+
+    corpus = {}
+    for number in range(1, documents + 1):
+        name = f"doc_{number:03d}"
+        document = make_document(rng, rng.randint(1, pages))
+        text_pdf_path = os.path.join(folder, "text", f"{name}.pdf")
+        write_text_pdf(text_pdf_path, document)
+        rasterize_pdf(
+            text_pdf_path, os.path.join(folder, "scanned", f"{name}.pdf"), rng
+        )
+        with open(
+            os.path.join(folder, "truth", f"{name}.txt"), mode="w", encoding="utf8"
+        ) as f:
+            f.write("\n".join("\n".join(lines) for lines in document))
+        corpus[name] = len(document)
+        print(f"Generated {name} ({len(document)} pages)")
+
+    with open(os.path.join(folder, "corpus.json"), mode="w", encoding="utf-8") as f:
+        json.dump(corpus, f, indent=1)
+    return corpus
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def character_error_rate(hypothesis, reference):
+    """Levenshtein distance between the texts divided by the reference length"""
+    hypothesis = np.frombuffer(normalize(hypothesis).encode("utf-32-le"), np.uint32)
+    reference = np.frombuffer(normalize(reference).encode("utf-32-le"), np.uint32)
+    if len(reference) == 0:
+        return float(len(hypothesis) > 0)
+
+    # One row of the edit distance table per hypothesis character.
+    # Insertions chain along the row, which a running minimum resolves.
+    positions = np.arange(len(reference) + 1)
+    row = positions.copy()
+    for index, char in enumerate(hypothesis, start=1):
+        substitution = row[:-1] + (reference != char)
+        deletion = row[1:] + 1
+        candidates = np.empty_like(row)
+        candidates[0] = index
+        candidates[1:] = np.minimum(substitution, deletion)
+        row = np.minimum.accumulate(candidates - positions) + positions
+    return float(row[-1]) / len(reference)
+
+
+def benchmark_backend(name, folder):
+    """Convert the corpus with one configuration and return its measurements.
+
+    Run in a fresh process so peak memory belongs to this backend alone.
+    """
+    with open(os.path.join(folder, "corpus.json"), mode="r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    backend_name, options = BENCHMARK_CONFIGS[name]
+    backend = get_backend(backend_name, **options)
+    start_time = time.time()
+    backend.load()
+    load_seconds = time.time() - start_time
+
+    results = {"backend": name, "load_seconds": load_seconds, "types": {}}
+    for document_type in DOCUMENT_TYPES:
+        seconds = 0.0
+        error_rates = []
+        failures = 0
+        routes = {}
+        for document_name in sorted(corpus):
+            with open(
+                os.path.join(folder, "truth", f"{document_name}.txt"),
+                mode="r",
+                encoding="utf8",
+            ) as f:
+                truth = f.read()
+            file_path = os.path.join(folder, document_type, f"{document_name}.pdf")
+            start_time = time.time()
+            try:
+                text = backend.convert_file(file_path)
+                routes[backend.route] = routes.get(backend.route, 0) + 1
+            except Exception as e:
+                print(f"Error converting {file_path} with {name}: {e}")
+                failures += 1
+                text = ""
+            seconds += time.time() - start_time
+            error_rates.append(character_error_rate(text, truth))
+
+        pages = sum(corpus.values())
+        results["types"][document_type] = {
+            "documents": len(corpus),
+            "pages": pages,
+            "seconds": seconds,
+            "pages_per_second": pages / seconds if seconds else 0,
+            "cer": sum(error_rates) / len(error_rates) if error_rates else None,
+            "failures": failures,
+            # How the documents were read, e.g. {"OCR": 10}
+            "routes": routes,
+        }
+
+    results["peak_rss_mb"] = peak_memory_mb()
+    # tesseract and pdftoppm run as child processes, outside peak_rss_mb
+    results["peak_child_rss_mb"] = peak_child_memory_mb()
+    return results
+
+
+def run_benchmarks(backends, folder=None):
+    folder = folder or corpus_folder
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in backends:
+        print(f"Benchmarking {name}...")
+        with context.Pool(processes=1) as pool:
+            result = pool.apply(benchmark_backend, (name, folder))
+        results.append(result)
+        for document_type, measurements in result["types"].items():
+            print(
+                f"{name:<22} {document_type:<8} "
+                f"{measurements['pages_per_second']:.2f} pages/sec, "
+                f"CER {measurements['cer']:.3f}, "
+                f"peak RSS {result['peak_rss_mb']:.0f} MB "
+                f"(largest child {result['peak_child_rss_mb']:.0f} MB), "
+                f"routes {measurements['routes']}"
+            )
+    report_preprocessing(results)
+    return results
+
+
+def report_preprocessing(results):
+    """Print the effect of image preprocessing on tesseract"""
+    by_name = {result["backend"]: result for result in results}
+    if "tesseract" not in by_name or "tesseract-preprocessed" not in by_name:
+        return
+    for document_type in DOCUMENT_TYPES:
+        raw = by_name["tesseract"]["types"][document_type]
+        preprocessed = by_name["tesseract-preprocessed"]["types"][document_type]
+        if not raw["seconds"] or not preprocessed["seconds"]:
+            continue
+        print(
+            f"Preprocessing on {document_type} PDFs: "
+            f"{raw['seconds'] / preprocessed['seconds']:.2f}x speed, "
+            f"CER {raw['cer']:.3f} -> {preprocessed['cer']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Benchmark OCR backends on a synthetic corpus of text-native and scanned PDFs."
+    )
+    arg_parser.add_argument("--corpus", default=corpus_folder, help="Corpus folder")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser(
+        "generate", help="Generate the synthetic corpus"
+    )
+    generate_parser.add_argument("--documents", type=int, default=10)
+    generate_parser.add_argument(
+        "--pages", type=int, default=3, help="Maximum pages per document"
+    )
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = subparsers.add_parser("run", help="Benchmark backends on the corpus")
+    run_parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=list(BENCHMARK_CONFIGS),
+        default=list(BENCHMARK_CONFIGS),
+    )
+
+    args = arg_parser.parse_args()
+
+    if args.command == "generate":
+        generate_corpus(args.corpus, args.documents, args.pages, args.seed)
+    else:
+        if not os.path.exists(os.path.join(args.corpus, "corpus.json")):
+            print(f"No corpus found in {args.corpus}")
+            exit()
+
+        results = run_benchmarks(args.backends, args.corpus)
+
+        os.makedirs(os.path.dirname(benchmark_output_path), exist_ok=True)
+        with open(benchmark_output_path, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {benchmark_output_path}")
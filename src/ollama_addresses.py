@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+import string
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import ollama
+
+# Increase when the prompt changes, so cached addresses are extracted again
+PROMPT_VERSION = 2
+
+# Ollama server, also read from the OLLAMA_HOST environment variable
+ollama_host = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+ollama_model = "llama3"
+
+# How long the server keeps the model loaded between requests
+keep_alive = "30m"
+
+# Seconds to wait for each response
+request_timeout = 120
+
+# Requests sent to the server at the same time
+max_concurrent_requests = 4
+
+# The prompt holds the text around the first few anchors, or the opening
+# characters of documents without any. Either way it is cut to
+# max_prompt_chars characters.
+window_before = 200
+window_after = 600
+max_windows = 3
+max_prompt_chars = 3000
+
+response_cache_folder = "data/summary/ollama_cache/"
+metrics_file_path = "data/summary/ollama_metrics.jsonl"
+
+# The heading naming the parties and words that precede the address
+PROMPT_ANCHORS = re.compile(
+    r"In the matter of|tenancy|occupation|dwelling|dweding|dweiling|property",
+    re.IGNORECASE,
+)
+
+# Calling for additional information stabilises the model output
+SCHEMA = """{
+        "Landlord Name(s)": "",
+        "Tenant Name(s)": "",
+        "Address": "",
+        }"""
+
+
+def prompt_window(text):
+    """Return the parts of text around the parties and address anchors"""
+    spans = []
+    for match in PROMPT_ANCHORS.finditer(text):
+        start = max(match.start() - window_before, 0)
+        end = min(match.end() + window_after, len(text))
+        if spans and start <= spans[-1][1]:
+            # Runs of nearby anchors merge into one window of bounded size
+            spans[-1][1] = max(spans[-1][1], min(end, spans[-1][0] + max_prompt_chars))
+        elif len(spans) < max_windows:
+            spans.append([start, end])
+        else:
+            break
+    if not spans:
+        return text[:max_prompt_chars]
+
+    separator = "\n...\n"
+    parts = []
+    remaining = max_prompt_chars
+    for start, end in spans:
+        if parts:
+            remaining -= len(separator)
+        if remaining <= 0:
+            break
+        parts.append(text[start : min(end, start + remaining)])
+        remaining -= len(parts[-1])
+    return separator.join(parts)
+
+
+def build_prompt(text):
+    payload = f"""
+        The following instructions are important and MUST be followed. Please read the following text and fill in the blanks in the JSON schema provided. Please do not respond conversationally. Please do not comment. You should respond with JSON like a REST API. Only return the JSON between curly braces. Respond strictly with valid JSON as this will be parsed directly with the python function json.loads().
+
+        text = ""{prompt_window(text)}""
+
+        schema = ""{SCHEMA}""
+        """
+    return payload
+
+
+class OllamaEngine:
+    """Extracts addresses with a model served by Ollama.
+
+    Responses are cached on disk by a hash of the model and prompt, so each
+    prompt is only sent once. The latency and token counts of every request
+    are appended to metrics_file_path. The engine can be shared between
+    threads.
+    """
+
+    def __init__(self, host=None, model=None, cache_folder=None):
+        self.host = host or ollama_host
+        self.model = model or ollama_model
+        self.cache_folder = cache_folder or response_cache_folder
+        self.client = ollama.Client(host=self.host, timeout=request_timeout)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+
+    def prompt_key(self, prompt):
+        return hashlib.sha256(f"{self.model}\n{prompt}".encode("utf8")).hexdigest()
+
+    def generate(self, prompt):
+        """Return the model's response to a prompt, from the cache if possible.
+
+        Raises ollama.ResponseError, ConnectionError or httpx.HTTPError if
+        the request fails.
+        """
+        key = self.prompt_key(prompt)
+        cache_path = os.path.join(self.cache_folder, f"{key}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, mode="r", encoding="utf-8") as f:
+                cached = json.load(f)
+            with self.lock:
+                self.cache_hits += 1
+            return cached["response"]
+
+        start_time = time.time()
+        try:
+            response = self.client.generate(
+                model=self.model,
+                prompt=prompt,
+                format="json",
+                keep_alive=keep_alive,
+            )
+        except (ollama.ResponseError, ConnectionError, httpx.HTTPError):
+            with self.lock:
+                self.failures += 1
+            raise
+        seconds = time.time() - start_time
+
+        metrics = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "model": self.model,
+            "prompt_sha256": key,
+            "seconds": round(seconds, 3),
+            "load_seconds": round((response["load_duration"] or 0) / 1e9, 3),
+            "prompt_tokens": response["prompt_eval_count"],
+            "response_tokens": response["eval_count"],
+        }
+        self.record(metrics)
+
+        os.makedirs(self.cache_folder, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            json.dump({"response": response["response"], **metrics}, f)
+        os.replace(temp_path, cache_path)
+        return response["response"]
+
+    def record(self, metrics):
+        with self.lock:
+            self.requests += 1
+            self.seconds += metrics["seconds"]
+            self.prompt_tokens += metrics["prompt_tokens"] or 0
+            self.response_tokens += metrics["response_tokens"] or 0
+            os.makedirs(os.path.dirname(metrics_file_path) or ".", exist_ok=True)
+            with open(metrics_file_path, mode="a", encoding="utf-8") as f:
+                f.write(json.dumps(metrics) + "\n")
+
+    def extract_address(self, text):
+        """Return the address named in a determination order, or None"""
+        try:
+            response = self.generate(build_prompt(text))
+        except (ollama.ResponseError, ConnectionError, httpx.HTTPError) as e:
+            print(f"Ollama request failed: {type(e).__name__}: {e}")
+            print("Unable to identify address!")
+            return None
+
+        # Clean and parse response
+        try:
+            address = json.loads(re.sub(r"`", "", response)).get("Address")
+        except (json.JSONDecodeError, AttributeError):
+            address = None
+        if not isinstance(address, str):
+            print("Unable to identify address!")
+            return None
+
+        # Remove leading and trailing whitespace
+        address = address.strip()
+        # Remove punctuation at the end
+        address = address.rstrip(string.punctuation)
+        print(f"Address: {address}")
+        return address
+
+    def prefetch(self, texts, workers=None):
+        """Send the prompts for texts concurrently, caching the responses.
+
+        texts may be a generator, and at most workers requests are in
+        flight. Failed requests are skipped, to be retried when the
+        address is extracted.
+        """
+        workers = workers or max_concurrent_requests
+
+        def fetch(text):
+            try:
+                self.generate(build_prompt(text))
+            except (ollama.ResponseError, ConnectionError, httpx.HTTPError) as e:
+                print(f"Ollama request failed: {type(e).__name__}: {e}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for text in texts:
+                pending.append(executor.submit(fetch, text))
+                if len(pending) >= workers * 2:
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+
+    def summary(self):
+        with self.lock:
+            if not self.requests:
+                return f"Ollama: {self.cache_hits} cached, {self.failures} failed"
+            return (
+                f"Ollama: {self.requests} requests, {self.cache_hits} cached, "
+                f"{self.failures} failed, "
+                f"{self.seconds / self.requests:.2f}s mean latency, "
+                f"{self.prompt_tokens} prompt and {self.response_tokens} response tokens"
+            )
@@ -0,0 +1,103 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Text following these words in a prompt is returned as the address
+ADDRESS_PATTERN = re.compile(
+    r"(?:tenancy|occupation) of(?: the dwelling at)?\s+(.*?)(?:\.\s|\n|$)",
+    re.IGNORECASE,
+)
+
+
+def create_ollama_stub(port=0, latency=0.0):
+    """Serve a stand-in for Ollama's /api/generate on localhost
+
+    The address is read from the prompt with a regular expression, so runs
+    can be tested and timed without a model. latency adds a delay in seconds
+    to each response. The server's requests and peak_concurrency attributes
+    count the requests received and the most handled at once.
+    """
+    lock = threading.Lock()
+    in_flight = 0
+
+    class OllamaStubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            nonlocal in_flight
+            if self.path != "/api/generate":
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                request = json.loads(body)
+                prompt = request["prompt"]
+            except (ValueError, KeyError, TypeError):
+                self.send_error(400)
+                return
+
+            with lock:
+                in_flight += 1
+                self.server.requests += 1
+                self.server.peak_concurrency = max(
+                    self.server.peak_concurrency, in_flight
+                )
+            start_time = time.time()
+            time.sleep(latency)
+            match = ADDRESS_PATTERN.search(prompt)
+            answer = {
+                "Landlord Name(s)": "",
+                "Tenant Name(s)": "",
+                "Address": match.group(1).strip() if match else "",
+            }
+            elapsed = int((time.time() - start_time) * 1e9)
+            with lock:
+                in_flight -= 1
+
+            response = json.dumps(
+                {
+                    "model": request.get("model", ""),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "response": json.dumps(answer),
+                    "done": True,
+                    "done_reason": "stop",
+                    "total_duration": elapsed,
+                    "load_duration": 0,
+                    "prompt_eval_count": len(prompt.split()),
+                    "prompt_eval_duration": elapsed // 2,
+                    "eval_count": len(json.dumps(answer).split()),
+                    "eval_duration": elapsed - elapsed // 2,
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), OllamaStubHandler)
+    server.requests = 0
+    server.peak_concurrency = 0
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Serve a stand-in for Ollama to test address extraction."
+    )
+    arg_parser.add_argument("--port", type=int, default=11435)
+    arg_parser.add_argument("--latency-ms", type=float, default=0)
+    args = arg_parser.parse_args()
+
+    server = create_ollama_stub(port=args.port, latency=args.latency_ms / 1000)
+    print(f"Serving a stub Ollama at http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{server.requests} requests, at most {server.peak_concurrency} at once")
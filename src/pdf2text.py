@@ -1,109 +1,290 @@
 import os
-from pdf2image import convert_from_path
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
+from header_pages import iter_header_pages
+from image_preprocessing import preprocess_page, render_dpi
+from utilities.count_text_pdfs import has_extractable_text
 
 input_folder = "data/downloaded_docs/"
 output_folder = "data/converted_text/"
 
+# Number of pages rasterized and OCRed at the same time
+ocr_workers = 2
 
-def get_file_paths(input_folder):
-    file_paths = []
+# Seconds allowed to rasterize or OCR a page, and to convert a whole document
+page_timeout = 120
+document_timeout = 1800
 
-    # Loop through the files in the input folder
-    for root, dirs, files in os.walk(input_folder):
-        for file in files:
-            # Construct the full file path
-            file_path = os.path.join(root, file)
-            file_paths.append(file_path)
+# Run each tesseract call single-threaded, as pages are OCRed in parallel
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
-    return file_paths
 
-
-def join_rows(text):
-    # Store the result
-    result = []
-
-    # Split multiline strings into a list of lines
-    lines = text.split("\n")
+def iter_paragraphs(chunks):
+    """Yield the paragraphs of text arriving in chunks, as join_rows would."""
+    # Part of a line not yet ended by a newline
+    pending = ""
 
     # Accumulate lines into paragraphs
     current_paragraph = ""
-    for line in lines:
-        # If the line is not empty
-        if line.strip():
-            # Add the line to the current paragraph
-            current_paragraph += line + " "
-            # If the line ends with a colon or full stop, start a new paragraph
-            if line.strip().endswith(":") or line.strip().endswith("."):
-                result.append(current_paragraph.strip())
-                current_paragraph = ""
+    for chunk in chain(chunks, [None]):
+        if chunk is None:
+            lines = [pending]
         else:
-            # Add the current paragraph to the result if not empty
-            if current_paragraph:
-                result.append(current_paragraph.strip())
-                current_paragraph = ""
+            # Split multiline strings into a list of lines
+            lines = (pending + chunk).split("\n")
+            pending = lines.pop()
+
+        for line in lines:
+            # If the line is not empty
+            if line.strip():
+                # Add the line to the current paragraph
+                current_paragraph += line + " "
+                # If the line ends with a colon or full stop, start a new paragraph
+                if line.strip().endswith(":") or line.strip().endswith("."):
+                    yield current_paragraph.strip()
+                    current_paragraph = ""
+            else:
+                # Yield the current paragraph if not empty
+                if current_paragraph:
+                    yield current_paragraph.strip()
+                    current_paragraph = ""
 
-    # Add the remaining paragraph to the result if not empty
+    # Yield the remaining paragraph if not empty
     if current_paragraph:
-        result.append(current_paragraph.strip())
+        yield current_paragraph.strip()
 
+
+def join_rows(text):
     # Join the paragraphs with newlines and return the result
-    return "\n".join(result)
+    return "\n".join(iter_paragraphs([text]))
+
+
+def extract_text_layer(file_path):
+    """Return the embedded text of each page using poppler's pdftotext."""
+    result = subprocess.run(
+        ["pdftotext", "-enc", "UTF-8", file_path, "-"],
+        capture_output=True,
+        check=True,
+    )
+    # pdftotext ends every page with a form feed
+    pages = result.stdout.decode("utf-8", errors="replace").split("\x0c")
+    return pages[:-1] if len(pages) > 1 else pages
+
+
+def ocr_page(file_path, page_number, preprocess=False):
+    """Rasterize a single page and OCR it with tesseract.
+
+    With preprocess the page is deskewed, cropped, downscaled and binarized
+    first (see image_preprocessing).
+    """
+    images = convert_from_path(
+        file_path,
+        dpi=render_dpi,
+        first_page=page_number,
+        last_page=page_number,
+        timeout=page_timeout,
+    )
+    image, config = images[0], ""
+    if preprocess:
+        image, dpi = preprocess_page(image, render_dpi)
+        config = f"--dpi {dpi}"
+    return pytesseract.image_to_string(image, config=config, timeout=page_timeout)
+
+
+def iter_ordered(function, items, workers):
+    """Yield function(*item) for each item in order, running ahead in threads.
 
+    At most workers calls are in flight or waiting to be consumed, so only
+    a few page images are held in memory at once.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, *item))
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-def pdf2text(file_path, output_folder, subfolder, page_numbers=False):
-    images = convert_from_path(file_path)
 
-    # Extract the file name
-    path, file_name = os.path.split(file_path)
-    base_name, extension = os.path.splitext(file_name)
+def route_pages(file_path, force_ocr=False, index=None):
+    """Return the route taken for a PDF and the text layer of each page.
+
+    Born-digital PDFs are read from their text layer and only pages without
+    any text (e.g. scanned attachments) are left empty to be OCRed. Scanned
+    PDFs are OCRed in full. Classifications are read from index if given.
+    """
+    if force_ocr:
+        has_text = False
+    elif index is not None:
+        has_text = index.has_text(file_path)
+    else:
+        has_text = has_extractable_text(file_path)
+
+    if has_text:
+        pages = extract_text_layer(file_path)
+        scanned_pages = sum(1 for txt in pages if not txt.strip())
+        print(
+            f"Route: text layer ({len(pages) - scanned_pages} pages), "
+            f"OCR ({scanned_pages} pages)"
+        )
+        route = "text layer + OCR" if scanned_pages else "text layer"
+    else:
+        print("Route: OCR (no text layer)" if not force_ocr else "Route: OCR (forced)")
+        pages = [""] * pdfinfo_from_path(file_path)["Pages"]
+        route = "OCR"
 
     # Get the number of pages
-    page_count = len(images)
-    print(f"Pages: {page_count}")
+    print(f"Pages: {len(pages)}")
+    return route, pages
 
-    # Combine text from multiple pages
-    combined_text = ""
 
-    # Iterate through pages
-    for page_number, image_data in enumerate(images, start=1):
-        txt = pytesseract.image_to_string(image_data)
+def iter_pages(file_path, pages, workers=None, preprocess=False):
+    """Yield the text of each page, OCRing the pages that have none.
 
-        # Remove form feed character
-        txt = txt.replace("\x0c", "")
+    pages holds the text layer of each page (see route_pages). Each page is
+    rasterized on its own, so memory does not grow with the page count.
+    preprocess cleans up page images before OCR.
+    """
+    workers = workers or ocr_workers
 
-        # Combine pages and add page numbers if requested
-        if page_numbers:
-            combined_text += f"Page # {str(page_number)}\n\n"
-            combined_text += f"{txt}\n\n"
-        else:
-            combined_text += f"{txt}"
+    def read_page(page_number, txt):
+        return txt if txt.strip() else ocr_page(file_path, page_number, preprocess)
+
+    yield from iter_ordered(read_page, enumerate(pages, start=1), workers)
+
+
+def iter_text(pages, page_numbers=False, first_pages=None):
+    """Yield the text of a document as its pages are read.
+
+    Lines that don't end with a full stop are joined into paragraphs, one
+    per line. With first_pages only the opening pages that hold the
+    order's details are read.
+    """
+    if first_pages:
+        pages = iter_header_pages(pages, first_pages)
+
+    start_time = time.time()
+
+    def iter_chunks():
+        # Iterate through pages
+        for page_number, txt in enumerate(pages, start=1):
+            if time.time() - start_time > document_timeout:
+                raise TimeoutError(
+                    f"Document exceeded {document_timeout}s at page {page_number}"
+                )
+
+            # Remove form feed character
+            txt = txt.replace("\x0c", "")
+
+            # Add page numbers if requested
+            if page_numbers:
+                yield f"Page # {str(page_number)}\n\n{txt}\n\n"
+            else:
+                yield txt
+
+    for count, paragraph in enumerate(iter_paragraphs(iter_chunks())):
+        yield f"\n{paragraph}" if count else paragraph
 
-    # Join lines that don't end with a full stop
-    combined_text = join_rows(combined_text)
 
-    # Create the subfolder in the output folder if it doesn't exist
-    subfolder_path = os.path.join(output_folder, subfolder)
-    if not os.path.exists(subfolder_path):
-        os.makedirs(subfolder_path)
+if __name__ == "__main__":
+    import argparse
 
-    # Write combined text to a file in the corresponding subfolder
-    output_file_path = os.path.join(subfolder_path, f"{base_name}.txt")
-    print(f"Output: {output_file_path}")
-    with open(output_file_path, mode="w", encoding="utf8") as f:
-        f.write(combined_text)
+    from convert_documents import convert_documents
+    from header_pages import start_full_pass
+    from ocr_backends import TesseractBackend
+    from quarantine import Quarantine
 
+    parser = argparse.ArgumentParser(
+        description="Convert PDF documents to text, using tesseract OCR for scanned pages."
+    )
+    parser.add_argument(
+        "--force-ocr",
+        action="store_true",
+        help="OCR every page, ignoring any embedded text layer",
+    )
+    parser.add_argument(
+        "--page-numbers",
+        action="store_true",
+        help="Add page number headings to the output",
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=input_folder,
+        help=f"Input folder path (default: {input_folder})",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=output_folder,
+        help=f"Output folder path (default: {output_folder})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Convert every document, even if it is unchanged since the last run",
+    )
+    parser.add_argument(
+        "--ocr-workers",
+        type=int,
+        default=ocr_workers,
+        help=f"Pages OCRed at the same time (default: {ocr_workers})",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="Deskew, crop, downscale and binarize page images before OCR",
+    )
+    parser.add_argument(
+        "--first-pages",
+        type=int,
+        help="Only convert the first N pages, reading on until the order's "
+        "details are found, then convert in full in the background",
+    )
+    parser.add_argument(
+        "--no-full-pass",
+        action="store_true",
+        help="With --first-pages, do not start the background full conversion",
+    )
+    parser.add_argument(
+        "--page-timeout",
+        type=int,
+        default=page_timeout,
+        help=f"Seconds allowed to rasterize or OCR a page (default: {page_timeout})",
+    )
+    parser.add_argument(
+        "--document-timeout",
+        type=int,
+        default=document_timeout,
+        help=f"Seconds allowed per document (default: {document_timeout})",
+    )
+    parser.add_argument(
+        "--retry-quarantined",
+        action="store_true",
+        help="Retry documents quarantined after repeated failures",
+    )
 
-def process_pdfs(input_folder, output_folder, page_numbers=False):
-    file_paths = get_file_paths(input_folder)
+    args = parser.parse_args()
 
-    for file_path in file_paths:
-        print(f"Processing: {file_path}")
-        # Identify the subfolder name
-        subfolder = os.path.basename(os.path.dirname(file_path))
-        print(f"Subfolder: {subfolder}")
-        # Process the PDF and store it in the corresponding output subfolder
-        pdf2text(file_path, output_folder, subfolder, page_numbers)
+    if args.retry_quarantined:
+        Quarantine().release_all()
 
+    backend = TesseractBackend(
+        force_ocr=args.force_ocr,
+        ocr_workers=args.ocr_workers,
+        preprocess=args.preprocess,
+        page_numbers=args.page_numbers,
+        first_pages=args.first_pages,
+        page_timeout=args.page_timeout,
+        document_timeout=args.document_timeout,
+    )
+    convert_documents(args.input, args.output, backend, use_cache=not args.no_cache)
 
-process_pdfs(input_folder, output_folder, page_numbers=False)
+    if args.first_pages and not args.no_full_pass:
+        start_full_pass()
@@ -0,0 +1,73 @@
+import json
+import os
+
+quarantine_file_path = "data/summary/quarantine.json"
+
+# Failed or timed out conversions before a document is skipped
+quarantine_after = 2
+
+
+class Quarantine:
+    """Documents that repeatedly fail to convert, keyed by path.
+
+    Failures are counted per file version (size and modification time), so
+    a document is retried once it has been downloaded again.
+    """
+
+    def __init__(self, path=None, max_failures=None):
+        self.path = path or quarantine_file_path
+        self.max_failures = max_failures or quarantine_after
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, mode="r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def file_version(self, file_path):
+        stat = os.stat(file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def failures(self, file_path):
+        entry = self.entries.get(file_path)
+        if entry is None or entry["version"] != self.file_version(file_path):
+            return 0
+        return entry["failures"]
+
+    def is_quarantined(self, file_path):
+        return self.failures(file_path) >= self.max_failures
+
+    def filter(self, file_paths):
+        """Return the documents that are not quarantined"""
+        allowed = [path for path in file_paths if not self.is_quarantined(path)]
+        if len(allowed) < len(file_paths):
+            print(
+                f"Skipping {len(file_paths) - len(allowed)} quarantined documents "
+                f"(see {self.path})"
+            )
+        return allowed
+
+    def record_failure(self, file_path, error):
+        failures = self.failures(file_path) + 1
+        self.entries[file_path] = {
+            "version": self.file_version(file_path),
+            "failures": failures,
+            "error": str(error),
+        }
+        if failures >= self.max_failures:
+            print(f"Quarantined after {failures} failures: {file_path}")
+        self.save()
+
+    def record_success(self, file_path):
+        if self.entries.pop(file_path, None) is not None:
+            self.save()
+
+    def release_all(self):
+        """Allow every quarantined document to be retried"""
+        self.entries = {}
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(temp_path, self.path)
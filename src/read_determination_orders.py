@@ -1,15 +1,25 @@
+import contextlib
+import hashlib
+import io
+import multiprocessing
 import os
 import re
 import string
 import csv
+from functools import partial
 from dateutil import parser
-import json
-import ollama
+from extraction_cache import ExtractionCache
+import ollama_addresses
+from ollama_addresses import OllamaEngine
 
 input_folder = "data/converted_text/determinations"
 keywords_file = "reference/keywords.txt"
 csv_output_file_path = "data/summary/determination_details.csv"
 
+# Increase when a change to the extractors alters their results, so cached
+# details are extracted again
+EXTRACTOR_VERSION = 2
+
 
 def get_file_paths(input_folder):
     file_paths = []
@@ -30,80 +40,88 @@ def read_keywords(file_path):
     return keywords
 
 
+# Roles in the "In the matter of" heading, in order of priority: the labels
+# after the first and second names, which party is named first, and the
+# roles recorded for the tenant and the landlord
+PARTY_ROLES = [
+    ("Applican. Tenan.", "Responden. Land.ord", "tenant", "Applicant", "Respondent"),
+    ("Applican. Land.ord", "Responden. Tenan.", "landlord", "Respondent", "Applicant"),
+    (
+        "Applican./Responden. Tenan.",
+        "Responden./Applicant Land.ord",
+        "tenant",
+        "Applicant (Assumed)",
+        "Respondent (Assumed)",
+    ),
+    (
+        "Applican./Responden. Land.ord",
+        "Responden./Applican. Tenan.",
+        "landlord",
+        "Respondent (Assumed)",
+        "Applicant (Assumed)",
+    ),
+    ("Tenan.", "Land.ord", "tenant", "Applicant (Assumed)", "Respondent (Assumed)"),
+    ("Land.ord", "Tenan.", "landlord", "Respondent (Assumed)", "Applicant (Assumed)"),
+    ("Appellan. Tenan.", "Responden. Land.ord", "tenant", "Applicant", "Respondent"),
+    ("Appellan. Land.ord", "Responden. Tenan.", "landlord", "Respondent", "Applicant"),
+]
+
+
+def role_label(label):
+    return r"[\{\(\[]" + label + r"(?:s|\(s\))?[\)\}\]]"
+
+
+# Each party pattern starts with the anchor, so the alternatives are only
+# tried where it occurs
+HEADING_ANCHOR = re.compile(r"In the matter of", re.IGNORECASE)
+PARTIES_PATTERN = re.compile(
+    r"In the matter of (?:"
+    + "|".join(
+        f"(?P<first{number}>.+?) {role_label(first)}(?: and )?"
+        f"(?P<second{number}>.+?) {role_label(second)}"
+        for number, (first, second, *_) in enumerate(PARTY_ROLES)
+    )
+    + ")",
+    re.IGNORECASE,
+)
+
+
+def match_parties(text):
+    """Return (roles number, match) for the parties in the heading, or None.
+
+    At each anchor the combined pattern matches the first roles in
+    PARTY_ROLES that fit. The highest priority roles found at any anchor
+    win, at their first anchor, as when each pattern is searched in turn.
+    """
+    best = None
+    for anchor in HEADING_ANCHOR.finditer(text):
+        match = PARTIES_PATTERN.match(text, anchor.start())
+        if match is None:
+            continue
+        number = int(match.lastgroup.removeprefix("second"))
+        if best is None or number < best[0]:
+            best = number, match
+            if number == 0:
+                break
+    return best
+
+
 def extract_names(text):
     tenant_name = None
     landlord_name = None
     tenant_role = None
     landlord_role = None
-    # Define alternate regular expression patterns
-    pattern1 = r"In the matter of (.+?) [\{\(\[]Applican. Tenan.(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Responden. Land.ord(?:s|\(s\))?[\)\}\]]"
-    pattern2 = r"In the matter of (.+?) [\{\(\[]Applican. Land.ord(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Responden. Tenan.(?:s|\(s\))?[\)\}\]]"
-    pattern3 = r"In the matter of (.+?) [\{\(\[]Applican./Responden. Tenan.(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Responden./Applicant Land.ord(?:s|\(s\))?[\)\}\]]"
-    pattern4 = r"In the matter of (.+?) [\{\(\[]Applican./Responden. Land.ord(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Responden./Applican. Tenan.(?:s|\(s\))?[\)\}\]]"
-    pattern5 = r"In the matter of (.+?) [\{\(\[]Tenan.(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Land.ord(?:s|\(s\))?[\)\}\]]"
-    pattern6 = r"In the matter of (.+?) [\{\(\[]Land.ord(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Tenan.(?:s|\(s\))?[\)\}\]]"
-    pattern7 = r"In the matter of (.+?) [\{\(\[]Appellan. Tenan.(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Responden. Land.ord(?:s|\(s\))?[\)\}\]]"
-    pattern8 = r"In the matter of (.+?) [\{\(\[]Appellan. Land.ord(?:s|\(s\))?[\)\}\]](?: and )?(.+?) [\{\(\[]Responden. Tenan.(?:s|\(s\))?[\)\}\]]"
-
-    # Try to find a match
-    match1 = re.search(pattern1, text, re.IGNORECASE)
-    match2 = re.search(pattern2, text, re.IGNORECASE)
-    match3 = re.search(pattern3, text, re.IGNORECASE)
-    match4 = re.search(pattern4, text, re.IGNORECASE)
-    match5 = re.search(pattern5, text, re.IGNORECASE)
-    match6 = re.search(pattern6, text, re.IGNORECASE)
-    match7 = re.search(pattern7, text, re.IGNORECASE)
-    match8 = re.search(pattern8, text, re.IGNORECASE)
-
-    # If the first pattern doesn't match, try the second pattern
-    if match1:
-        # Extract the names for 'Applicant Tenant' and 'Respondent Landlord' using the first pattern
-        tenant_name = match1.group(1).strip()
-        landlord_name = match1.group(2).strip()
-        tenant_role = "Applicant"
-        landlord_role = "Respondent"
-    elif match2:
-        # Extract the names for 'Applicant Landlord' and 'Respondent Tenant' using the second pattern
-        landlord_name = match2.group(1).strip()
-        tenant_name = match2.group(2).strip()
-        tenant_role = "Respondent"
-        landlord_role = "Applicant"
-    elif match3:
-        # Extract the names for 'Applicant/Respondent Tenant' and 'Respondent/Applicant Landlord' using the third pattern
-        tenant_name = match3.group(1).strip()
-        landlord_name = match3.group(2).strip()
-        tenant_role = "Applicant (Assumed)"
-        landlord_role = "Respondent (Assumed)"
-    elif match4:
-        # Extract the names for 'Respondent/Applicant Landlord' and 'Applicant/Respondent Tenant' using the fourth pattern
-        landlord_name = match4.group(1).strip()
-        tenant_name = match4.group(2).strip()
-        tenant_role = "Respondent (Assumed)"
-        landlord_role = "Applicant (Assumed)"
-    elif match5:
-        # Extract the names for 'Tenant' and 'Landlord' using the fifth pattern
-        tenant_name = match5.group(1).strip()
-        landlord_name = match5.group(2).strip()
-        tenant_role = "Applicant (Assumed)"
-        landlord_role = "Respondent (Assumed)"
-    elif match6:
-        # Extract the names for 'Landlord' and 'Tenant' using the sixth pattern
-        landlord_name = match6.group(1).strip()
-        tenant_name = match6.group(2).strip()
-        tenant_role = "Respondent (Assumed)"
-        landlord_role = "Applicant (Assumed)"
-    elif match7:
-        # Extract the names for 'Appellant Tenant' and 'Respondent Landlord' using the first pattern
-        tenant_name = match7.group(1).strip()
-        landlord_name = match7.group(2).strip()
-        tenant_role = "Applicant"
-        landlord_role = "Respondent"
-    elif match8:
-        # Extract the names for 'Appellant Landlord' and 'Respondent Tenant' using the second pattern
-        landlord_name = match8.group(1).strip()
-        tenant_name = match8.group(2).strip()
-        tenant_role = "Respondent"
-        landlord_role = "Applicant"
+
+    parties = match_parties(text)
+    if parties:
+        number, match = parties
+        first_name = match.group(f"first{number}").strip()
+        second_name = match.group(f"second{number}").strip()
+        first_party, tenant_role, landlord_role = PARTY_ROLES[number][2:]
+        if first_party == "tenant":
+            tenant_name, landlord_name = first_name, second_name
+        else:
+            landlord_name, tenant_name = first_name, second_name
     else:
         print("Unable to identify applicant and respondent!")
 
@@ -135,43 +153,15 @@ def extract_address_regex(text):
     return address
 
 
-def extract_address_ollama(text):
-    # Calling for additional information stabilises the model output
-    schema = """{
-        "Landlord Name(s)": "",
-        "Tenant Name(s)": "",
-        "Address": "",
-        }"""
-
-    payload = f"""
-        The following instructions are important and MUST be followed. Please read the following text and fill in the blanks in the JSON schema provided. Please do not respond conversationally. Please do not comment. You should respond with JSON like a REST API. Only return the JSON between curly braces. Respond strictly with valid JSON as this will be parsed directly with the python function json.loads().
-
-        text = ""{text}""
-
-        schema = ""{schema}"" 
-        """
-
-    try:
-        # Initialise and call Ollama
-        response = ollama.generate(
-            model="llama3",
-            prompt=f"{payload}",
-            format="json",
-        )
+def get_ollama_engine():
+    global ollama_engine
+    if ollama_engine is None:
+        ollama_engine = OllamaEngine()
+    return ollama_engine
 
-        # Clean and parse response
-        response_json = json.loads(re.sub(r"`", "", response["response"]))
-        address = response_json.get("Address")
-        # Remove leading and trailing whitespace
-        address = address.strip()
-        # Remove punctuation at the end
-        address = address.rstrip(string.punctuation)
-        print(f"Address: {address}")
-    except:
-        address = None
-        print("Unable to identify address!")
 
-    return address
+def extract_address_ollama(text):
+    return get_ollama_engine().extract_address(text)
 
 
 def extract_date(text):
@@ -205,29 +195,152 @@ def extract_date(text):
     return date
 
 
-def find_keywords(text):
-    matches = []
+def phrase_pattern(phrase):
+    # Words may be separated by any whitespace, including line breaks
+    return re.escape(phrase).replace(r"\ ", r"\s+")
+
+
+def trie_pattern(phrases):
+    """Return a pattern matching any of the phrases, sharing common prefixes.
+
+    Longer phrases are tried first, so the longest phrase is matched.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [
+            phrase_pattern(char) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Finds every keyword and phrase in a text in one pass.
+
+    Matching is case-insensitive, words in a phrase may be split by any
+    whitespace, and each keyword must start and end on a word boundary, as
+    with a separate search per keyword of the text with whitespace collapsed.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = keywords
+        self.sha256 = hashlib.sha256("\n".join(keywords).encode("utf8")).hexdigest()
+        # Keywords with whitespace other than single spaces can never match
+        phrases = {
+            keyword.lower()
+            for keyword in keywords
+            if " ".join(keyword.split()) == keyword
+        }
+        # The phrase matched at a position is the longest one there, and
+        # only its prefixes can also match at that position
+        self.pattern = re.compile(r"(?=\b(" + trie_pattern(phrases) + r")\b)")
+        self.prefixes = {
+            phrase: [
+                (other, re.compile(r"\b" + phrase_pattern(other) + r"\b"))
+                for other in phrases
+                if other != phrase and phrase.startswith(other)
+            ]
+            for phrase in phrases
+        }
+
+    def find(self, text):
+        """Return (start, end) offsets in text of each keyword found, by keyword"""
+        text_lower = text.lower()
+        hits = {}
+        if not self.prefixes:
+            return hits
+        for match in self.pattern.finditer(text_lower):
+            phrase = " ".join(match.group(1).split())
+            hits.setdefault(phrase, []).append(match.span(1))
+            for other, other_pattern in self.prefixes[phrase]:
+                other_match = other_pattern.match(text_lower, match.start())
+                if other_match:
+                    hits.setdefault(other, []).append(other_match.span())
+
+        return {
+            keyword: hits[keyword.lower()]
+            for keyword in self.keywords
+            if keyword.lower() in hits
+        }
 
-    # Read the keywords file
-    keywords = read_keywords(keywords_file)
 
-    # Convert the text to lowercase for case-insensitive matching
-    text_lower = text.lower()
+# Built from keywords_file on first use
+keyword_matcher = None
 
-    # Split the text into words
-    words = text_lower.split()
+# Connects to the Ollama server on first use
+ollama_engine = None
 
-    # Search for matching words and phrases
-    for keyword in keywords:
-        if re.search(r"\b" + re.escape(keyword).lower() + r"\b", " ".join(words)):
-            matches.append(keyword)
+
+def get_keyword_matcher():
+    global keyword_matcher
+    if keyword_matcher is None:
+        keyword_matcher = KeywordMatcher(read_keywords(keywords_file))
+    return keyword_matcher
+
+
+def match_keywords(text):
+    """Return the hit count and (start, end) offsets of each keyword in text"""
+    return {
+        keyword: {"count": len(offsets), "offsets": offsets}
+        for keyword, offsets in get_keyword_matcher().find(text).items()
+    }
+
+
+def find_keywords(text):
+    """Return the keywords found in text and their hits (see match_keywords)"""
+    hits = match_keywords(text)
+    # Keywords in the order they are listed, each found at least once
+    matches = [keyword for keyword in get_keyword_matcher().keywords if keyword in hits]
 
     print(f"Keyword matches: {matches}")
 
-    return matches
+    return matches, hits
+
 
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf8")).hexdigest()
 
-def read_determination_orders(file_path, address_method):
+
+def is_current(cached, text):
+    """Return True if a cache entry was extracted from text by this version"""
+    return (
+        cached is not None
+        and cached["sha256"] == text_sha256(text)
+        and cached["version"] == EXTRACTOR_VERSION
+    )
+
+
+def address_key(address_method):
+    """Key of an address in the cache, naming the model and prompt for Ollama"""
+    if address_method == "ollama":
+        return (
+            f"ollama:{ollama_addresses.ollama_model}:"
+            f"prompt-{ollama_addresses.PROMPT_VERSION}"
+        )
+    return address_method
+
+
+def read_determination_orders(file_path, address_method, cached=None):
+    """Extract the details of a determination order as a row of the CSV.
+
+    cached is the file's entry in the extraction cache, if any. Details in
+    it are reused while the text and EXTRACTOR_VERSION are unchanged, and
+    keywords while the keyword list is unchanged. The entry also keeps the
+    hit count and offsets of each keyword. Returns the row and the updated
+    entry.
+    """
     # Extract the file name
     path, file_name = os.path.split(file_path)
     base_name, extension = os.path.splitext(file_name)
@@ -236,51 +349,117 @@ def read_determination_orders(file_path, address_method):
     with open(file_path, "r", encoding="utf8") as file:
         text = file.read()
 
-        # Extract Landlord and Tenant Names
-        tenant_name, tenant_role, landlord_name, landlord_role = extract_names(text)
-
-        # Extract addresses based on the selected method
+    entry = {"sha256": text_sha256(text), "version": EXTRACTOR_VERSION}
+    if is_current(cached, text):
+        entry = {**cached, "addresses": dict(cached["addresses"])}
+        print("Using cached details")
+
+    # Extract Landlord and Tenant Names
+    if "names" not in entry:
+        entry["names"] = list(extract_names(text))
+    tenant_name, tenant_role, landlord_name, landlord_role = entry["names"]
+
+    # Extract addresses based on the selected method
+    addresses = entry.setdefault("addresses", {})
+    key = address_key(address_method)
+    if key in addresses:
+        address = addresses[key]
+    else:
         if address_method == "ollama":
             address = extract_address_ollama(text)
         else:
             address = extract_address_regex(text)
+        # Failed Ollama calls are tried again on the next run
+        if address is not None or address_method != "ollama":
+            addresses[key] = address
+
+    # Extract date
+    if "date" not in entry:
+        entry["date"] = extract_date(text)
+    date = entry["date"]
+
+    # List determination keywords
+    keywords_sha256 = get_keyword_matcher().sha256
+    if entry.get("keywords_sha256") != keywords_sha256 or "keyword_hits" not in entry:
+        entry["keywords"], entry["keyword_hits"] = find_keywords(text)
+        entry["keywords_sha256"] = keywords_sha256
+    keywords_list = entry["keywords"]
+    keyword_counts = {
+        keyword: entry["keyword_hits"][keyword]["count"] for keyword in keywords_list
+    }
+
+    row = [
+        file_name,
+        date,
+        keywords_list,
+        keyword_counts,
+        address,
+        tenant_name,
+        tenant_role,
+        landlord_name,
+        landlord_role,
+    ]
+    return row, entry
+
+
+def iter_texts_to_send(tasks):
+    """Yield the texts of the files without a cached Ollama address"""
+    for file_path, cached in tasks:
+        with open(file_path, "r", encoding="utf8") as file:
+            text = file.read()
+        if not (
+            is_current(cached, text) and address_key("ollama") in cached["addresses"]
+        ):
+            yield text
+
+
+def read_in_worker(task, address_method):
+    """Extract a (file_path, cached) task in a worker process.
+
+    Returns the row and cache entry with the log output, which is printed
+    by the writer so output stays in file order.
+    """
+    file_path, cached = task
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        print(f"Processing: {file_path}")
+        row, entry = read_determination_orders(file_path, address_method, cached)
+    return file_path, row, entry, log.getvalue()
+
+
+def process_determination_orders(
+    input_folder, address_method, workers=1, use_cache=True
+):
+    """Extract the details of each text file and write them to the CSV.
+
+    With several workers the files are read in parallel processes, and the
+    rows are written here in file order as they arrive, with the CSV kept
+    open for the whole run. The CSV is rebuilt on every run, but details of
+    unchanged files are taken from the extraction cache.
+    """
+    file_paths = sorted(get_file_paths(input_folder))
+    cache = ExtractionCache() if use_cache else None
+    tasks = [
+        (file_path, cache.get(file_path) if cache else None) for file_path in file_paths
+    ]
+
+    # Send the Ollama requests concurrently up front, so the extraction
+    # below reads the responses from the cache
+    if address_method == "ollama":
+        print("Sending address prompts to Ollama...")
+        get_ollama_engine().prefetch(iter_texts_to_send(tasks))
+        print(get_ollama_engine().summary())
 
-        # Extract date
-        date = extract_date(text)
-
-        # List determination keywords
-        keywords_list = find_keywords(text)
-
-        # Write to CSV file
-        with open(
-            csv_output_file_path, mode="a", newline="", encoding="utf8"
-        ) as csv_file:
-            csv_writer = csv.writer(csv_file)
-            csv_writer.writerow(
-                [
-                    file_name,
-                    date,
-                    keywords_list,
-                    address,
-                    tenant_name,
-                    tenant_role,
-                    landlord_name,
-                    landlord_role,
-                ]
-            )
-
-
-def process_determination_orders(input_folder, address_method):
-    file_paths = get_file_paths(input_folder)
-
-    # Write CSV header
     with open(csv_output_file_path, mode="w", newline="", encoding="utf-8") as csv_file:
         csv_writer = csv.writer(csv_file)
+
+        # Write CSV header
         csv_writer.writerow(
             [
                 "Text Filename",
                 "Determination Date",
                 "Keywords",
+                "Keyword Counts",
                 "Address",
                 "Tenant Name(s)",
                 "Tenant Role",
@@ -289,9 +468,95 @@ def process_determination_orders(input_folder, address_method):
             ]
         )
 
-    for file_path in file_paths:
-        print(f"Processing: {file_path}")
-        read_determination_orders(file_path, address_method)
+        def write(file_path, row, entry):
+            csv_writer.writerow(row)
+            if cache:
+                cache.record(file_path, entry)
+
+        if workers > 1:
+            print(f"Starting {workers} workers...")
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(processes=workers) as pool:
+                results = pool.imap(
+                    partial(read_in_worker, address_method=address_method),
+                    tasks,
+                    chunksize=4,
+                )
+                for file_path, row, entry, log in results:
+                    print(log, end="")
+                    write(file_path, row, entry)
+        else:
+            for file_path, cached in tasks:
+                print(f"Processing: {file_path}")
+                write(
+                    file_path,
+                    *read_determination_orders(file_path, address_method, cached),
+                )
 
+    if cache:
+        cache.prune(input_folder, file_paths)
+        cache.save()
+    print(f"Extracted {len(file_paths)} determination orders to {csv_output_file_path}")
 
-process_determination_orders(input_folder, address_method="regex")
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Extract the parties, address, date and keywords of determination orders."
+    )
+    arg_parser.add_argument(
+        "--input",
+        type=str,
+        default=input_folder,
+        help=f"Folder of converted text files (default: {input_folder})",
+    )
+    arg_parser.add_argument(
+        "--output",
+        type=str,
+        default=csv_output_file_path,
+        help=f"Output CSV path (default: {csv_output_file_path})",
+    )
+    arg_parser.add_argument(
+        "--address-method",
+        choices=["regex", "ollama"],
+        default="regex",
+        help="Extract addresses with a regular expression or a local Ollama model "
+        "(default: regex)",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1)",
+    )
+    arg_parser.add_argument(
+        "--ollama-host",
+        type=str,
+        default=ollama_addresses.ollama_host,
+        help=f"Ollama server (default: {ollama_addresses.ollama_host})",
+    )
+    arg_parser.add_argument(
+        "--ollama-concurrency",
+        type=int,
+        default=ollama_addresses.max_concurrent_requests,
+        help="Ollama requests sent at the same time "
+        f"(default: {ollama_addresses.max_concurrent_requests})",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Extract every file again, ignoring the extraction cache",
+    )
+
+    args = arg_parser.parse_args()
+
+    csv_output_file_path = args.output
+    ollama_addresses.max_concurrent_requests = args.ollama_concurrency
+    # Worker processes read the host from the environment
+    os.environ["OLLAMA_HOST"] = args.ollama_host
+    ollama_addresses.ollama_host = args.ollama_host
+
+    process_determination_orders(
+        args.input, args.address_method, args.workers, use_cache=not args.no_cache
+    )
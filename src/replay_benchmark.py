@@ -0,0 +1,375 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import download_determination_orders as downloader
+import scrape_manifest
+import scrape_metrics
+from facetwp_harvester import (
+    build_refresh_payload,
+    date_facet,
+    parse_listing,
+    refresh_path,
+    type_facet,
+)
+from memory_usage import peak_memory_mb
+
+recording_folder = "data/replay/"
+benchmark_output_path = "data/summary/replay_benchmark.json"
+
+
+def request_key(url):
+    """Key a GET request by its path and query string"""
+    parts = urlsplit(url)
+    return f"GET {parts.path}?{parts.query}" if parts.query else f"GET {parts.path}"
+
+
+def refresh_key(selected_year, order_type, page_number):
+    return f"REFRESH {selected_year}|{order_type}|{page_number}"
+
+
+class Recording:
+    """Responses captured from the live site, stored on disk by request key"""
+
+    def __init__(self, folder=None):
+        self.folder = folder or recording_folder
+        self.index_path = os.path.join(self.folder, "recording.json")
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, mode="r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def add(self, key, body, content_type):
+        body_name = hashlib.sha256(key.encode()).hexdigest()
+        os.makedirs(os.path.join(self.folder, "bodies"), exist_ok=True)
+        with open(os.path.join(self.folder, "bodies", body_name), "wb") as f:
+            f.write(body)
+        self.entries[key] = {"body": body_name, "content_type": content_type}
+
+    def get(self, key):
+        """Return (body, content type) for a key, or None if not recorded"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(self.folder, "bodies", entry["body"]), "rb") as f:
+            return f.read(), entry["content_type"]
+
+    def years(self):
+        return sorted(
+            {
+                int(key.split()[1].split("|")[0])
+                for key in self.entries
+                if key.startswith("REFRESH")
+            }
+        )
+
+    def save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.index_path, mode="w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+
+
+def record(year_list, order_list, max_pages=None, documents=True, folder=None):
+    """Capture listing pages, refresh responses and documents from the site"""
+    recording = Recording(folder)
+    session = downloader.create_session()
+
+    for selected_year in year_list:
+        for order_type in order_list:
+            url = downloader.build_search_url(selected_year, order_type)
+            print(f"Recording: {url}")
+            response = session.get(url, timeout=60)
+            recording.add(
+                request_key(url), response.content, response.headers.get("content-type")
+            )
+
+            page_number = 1
+            while True:
+                payload = build_refresh_payload(
+                    selected_year, order_type, downloader.search_path, page_number
+                )
+                response = session.post(
+                    downloader.site_url + refresh_path, json=payload, timeout=60
+                )
+                response.raise_for_status()
+                data = response.json()
+
+                # Cap the pager so replays never ask for unrecorded pages
+                pager = data.get("settings", {}).get("pager", {})
+                total_pages = int(pager.get("total_pages") or 0)
+                if max_pages and total_pages > max_pages:
+                    pager["total_pages"] = max_pages
+                    total_pages = max_pages
+
+                recording.add(
+                    refresh_key(selected_year, order_type, page_number),
+                    json.dumps(data).encode(),
+                    "application/json",
+                )
+                print(f"Recorded page {page_number} of {total_pages}")
+
+                if documents:
+                    for listing_record in parse_listing(data.get("template") or ""):
+                        item = downloader.build_item_data(listing_record)
+                        if item is None:
+                            continue
+                        for doc_link in [
+                            item["Determination Doc"],
+                            item["Tribunal Doc"],
+                        ]:
+                            if (
+                                doc_link
+                                and request_key(doc_link) not in recording.entries
+                            ):
+                                doc = session.get(doc_link, timeout=60)
+                                recording.add(
+                                    request_key(doc_link),
+                                    doc.content,
+                                    doc.headers.get("content-type"),
+                                )
+
+                recording.save()
+                page_number += 1
+                if page_number > total_pages:
+                    break
+
+    session.close()
+    print(f"Recording saved to: {recording.folder}")
+    return recording
+
+
+def create_replay_server(recording, port=0, latency=0.0):
+    """Serve a recording over HTTP on localhost
+
+    Absolute links to the live site are rewritten to the replay server so
+    documents are fetched locally. latency adds a delay in seconds to each
+    response to approximate the network.
+    """
+    live_site = downloader.site_url.encode()
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def send_body(self, body, content_type):
+            time.sleep(latency)
+            if content_type and ("html" in content_type or "json" in content_type):
+                local_site = f"http://127.0.0.1:{self.server.server_port}".encode()
+                body = body.replace(live_site, local_site)
+                body = body.replace(
+                    live_site.replace(b"/", b"\\/"), local_site.replace(b"/", b"\\/")
+                )
+            self.send_response(200)
+            self.send_header("Content-Type", content_type or "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            response = recording.get(request_key(self.path))
+            if response is None:
+                self.send_error(404)
+                return
+            self.send_body(*response)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                data = json.loads(body)["data"]
+                facets = data["facets"]
+                key = refresh_key(
+                    (facets.get(date_facet) or ["All"])[0],
+                    "|".join(facets.get(type_facet, [])),
+                    data.get("paged", 1),
+                )
+            except (ValueError, KeyError, TypeError):
+                self.send_error(400)
+                return
+
+            response = recording.get(key)
+            if response is None:
+                # Searches that were not recorded have no results
+                empty = {
+                    "template": "",
+                    "settings": {"pager": {"total_rows": 0, "total_pages": 0}},
+                }
+                response = (json.dumps(empty).encode(), "application/json")
+            self.send_body(*response)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+
+
+def run_benchmark(recording, shards=1, download_files=True, latency=0.0):
+    """Run a browserless crawl against the replay server and time it"""
+    server = create_replay_server(recording, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    years = recording.years()
+    output_folder = tempfile.mkdtemp(prefix="replay_")
+    live_settings = {
+        name: getattr(downloader, name)
+        for name in [
+            "site_url",
+            "start_year",
+            "current_year",
+            "doc_folder",
+            "csv_output_file_path",
+            "shard_spool_folder",
+            "download_index_path",
+        ]
+    }
+    live_manifest_path = scrape_manifest.manifest_file_path
+    live_metrics_path = scrape_metrics.metrics_file_path
+
+    try:
+        # Point the downloader at the replay server and a scratch folder
+        downloader.site_url = f"http://127.0.0.1:{server.server_port}"
+        downloader.start_year = years[0]
+        downloader.current_year = years[-1]
+        downloader.doc_folder = os.path.join(output_folder, "downloaded_docs")
+        downloader.csv_output_file_path = os.path.join(
+            output_folder, "case_metadata.csv"
+        )
+        downloader.shard_spool_folder = os.path.join(output_folder, "shards")
+        downloader.download_index_path = os.path.join(
+            output_folder, "download_index.json"
+        )
+        scrape_manifest.manifest_file_path = os.path.join(
+            output_folder, "manifest.jsonl"
+        )
+        metrics_path = os.path.join(output_folder, "scrape_metrics.json")
+        scrape_metrics.metrics_file_path = metrics_path
+
+        start_time = time.time()
+        downloader.get_search_results(
+            browserless=True,
+            shards=shards,
+            preferences=("All", "adjudication-order|tribunal-order", download_files),
+        )
+        elapsed = time.time() - start_time
+        peak_memory = peak_memory_mb()
+
+        with open(metrics_path, mode="r", encoding="utf-8") as f:
+            totals = json.load(f)["totals"]
+    finally:
+        for name, value in live_settings.items():
+            setattr(downloader, name, value)
+        scrape_manifest.manifest_file_path = live_manifest_path
+        scrape_metrics.metrics_file_path = live_metrics_path
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    return {
+        "shards": shards,
+        "elapsed_seconds": elapsed,
+        "pages": totals["pages"],
+        "rows": totals["rows"],
+        "documents": totals["downloads"],
+        "failures": totals["failures"],
+        "pages_per_second": totals["pages"] / elapsed if elapsed else 0,
+        "documents_per_second": totals["downloads"] / elapsed if elapsed else 0,
+        "peak_memory_mb": peak_memory,
+    }
+
+
+def benchmark_in_process(recording, shards=1, download_files=True, latency=0.0):
+    """Run one benchmark in a fresh process, so peak memory belongs to it alone"""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=1) as pool:
+        return pool.apply(run_benchmark, (recording, shards, download_files, latency))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Record the RTB listing once and benchmark crawls against a local replay."
+    )
+    arg_parser.add_argument(
+        "--recording", default=recording_folder, help="Recording folder"
+    )
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser(
+        "record", help="Capture responses from the live site"
+    )
+    record_parser.add_argument("--years", type=int, nargs="+", required=True)
+    record_parser.add_argument(
+        "--order-types",
+        nargs="+",
+        default=["adjudication-order", "tribunal-order"],
+    )
+    record_parser.add_argument(
+        "--max-pages", type=int, help="Pages to record per search"
+    )
+    record_parser.add_argument(
+        "--no-documents", action="store_true", help="Do not record document files"
+    )
+
+    serve_parser = subparsers.add_parser("serve", help="Serve a recording on localhost")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--latency-ms", type=float, default=0)
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="Benchmark crawls against a recording"
+    )
+    bench_parser.add_argument("--shards", type=int, nargs="+", default=[1])
+    bench_parser.add_argument("--repeat", type=int, default=1)
+    bench_parser.add_argument("--latency-ms", type=float, default=0)
+    bench_parser.add_argument(
+        "--no-downloads", action="store_true", help="Crawl the listing only"
+    )
+
+    args = arg_parser.parse_args()
+
+    if args.command == "record":
+        record(
+            args.years,
+            args.order_types,
+            max_pages=args.max_pages,
+            documents=not args.no_documents,
+            folder=args.recording,
+        )
+
+    elif args.command == "serve":
+        server = create_replay_server(
+            Recording(args.recording), port=args.port, latency=args.latency_ms / 1000
+        )
+        print(f"Serving {args.recording} at http://127.0.0.1:{args.port}")
+        server.serve_forever()
+
+    else:
+        recording = Recording(args.recording)
+        if not recording.entries:
+            print(f"No recording found in {args.recording}")
+            exit()
+
+        results = []
+        for shards in args.shards:
+            for run in range(1, args.repeat + 1):
+                result = benchmark_in_process(
+                    recording,
+                    shards=shards,
+                    download_files=not args.no_downloads,
+                    latency=args.latency_ms / 1000,
+                )
+                results.append(result)
+                print(
+                    f"Shards: {shards} | Run {run}: "
+                    f"{result['pages_per_second']:.2f} pages/sec, "
+                    f"{result['documents_per_second']:.2f} documents/sec, "
+                    f"peak memory {result['peak_memory_mb']:.0f} MB"
+                )
+
+        os.makedirs(os.path.dirname(benchmark_output_path), exist_ok=True)
+        with open(benchmark_output_path, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {benchmark_output_path}")
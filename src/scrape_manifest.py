@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+
+manifest_file_path = "data/summary/scrape_manifest.jsonl"
+
+
+def order_keys(item):
+    """Return the manifest keys identifying a scraped listing item"""
+    keys = []
+    if item.get("DR No."):
+        keys.append(f"DR:{item['DR No.']}")
+    if item.get("TR No."):
+        keys.append(f"TR:{item['TR No.']}")
+    for column in ["Determination Doc", "Tribunal Doc"]:
+        if item.get(column):
+            keys.append(f"URL:{item[column]}")
+    return keys
+
+
+def shard_key(year, order_type):
+    return f"{year}|{order_type}"
+
+
+class ScrapeManifest:
+    """Persistent record of known orders and crawl progress.
+
+    The manifest is an append-only JSON Lines journal so that each page can
+    be recorded cheaply and a crash loses at most the page in progress.
+    Entries are either known orders ({"keys": [...]}) or page checkpoints
+    ({"shard": "<year>|<order type>", "page": n, "complete": bool}).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or manifest_file_path
+        self.known = set()
+        self.checkpoints = {}
+        self.lock = threading.Lock()
+        self._load()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, mode="a", encoding="utf-8")
+        # Start after a partially written last line, so it is not joined
+        # to the first entry of this run
+        if self.file.tell() and not self._ends_with_newline():
+            self.file.write("\n")
+
+    def _ends_with_newline(self):
+        with open(self.path, mode="rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Ignore a partially written last line after a crash
+                    continue
+                if "keys" in entry:
+                    self.known.update(entry["keys"])
+                elif "shard" in entry:
+                    self.checkpoints[entry["shard"]] = entry
+                elif entry.get("reset"):
+                    self.checkpoints = {}
+
+        print(
+            f"Loaded manifest: {len(self.known)} known keys, "
+            f"{len(self.checkpoints)} checkpoints"
+        )
+
+    def _append(self, entry):
+        self.file.write(json.dumps(entry) + "\n")
+
+    def is_known(self, item):
+        return any(key in self.known for key in order_keys(item))
+
+    def filter_new(self, items):
+        """Return the items not already recorded in the manifest"""
+        with self.lock:
+            return [item for item in items if not self.is_known(item)]
+
+    def record_page(self, year, order_type, page, items, complete=False):
+        """Record the orders on a completed page and checkpoint progress"""
+        with self.lock:
+            for item in items:
+                keys = order_keys(item)
+                if keys and not all(key in self.known for key in keys):
+                    self.known.update(keys)
+                    self._append({"keys": keys})
+
+            checkpoint = {
+                "shard": shard_key(year, order_type),
+                "page": page,
+                "complete": complete,
+            }
+            self.checkpoints[checkpoint["shard"]] = checkpoint
+            self._append(checkpoint)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def mark_complete(self, year, order_type):
+        with self.lock:
+            checkpoint = self.checkpoints.get(shard_key(year, order_type), {})
+            page = checkpoint.get("page", 0)
+        self.record_page(year, order_type, page, [], complete=True)
+
+    def reset_checkpoints(self):
+        """Forget crawl progress, keeping the known orders"""
+        with self.lock:
+            self.checkpoints = {}
+            self._append({"reset": True})
+            self.file.flush()
+
+    def resume_page(self, year, order_type):
+        """Return the page to resume a search from, or None if it is complete"""
+        checkpoint = self.checkpoints.get(shard_key(year, order_type))
+        if checkpoint is None:
+            return 1
+        if checkpoint["complete"]:
+            return None
+        return checkpoint["page"] + 1
+
+    def compact(self):
+        """Rewrite the journal as one entry per known key and checkpoint"""
+        with self.lock:
+            self.file.close()
+            temp_path = self.path + ".tmp"
+            with open(temp_path, mode="w", encoding="utf-8") as f:
+                if self.known:
+                    f.write(json.dumps({"keys": sorted(self.known)}) + "\n")
+                for checkpoint in self.checkpoints.values():
+                    f.write(json.dumps(checkpoint) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.file = open(self.path, mode="a", encoding="utf-8")
+
+    def close(self):
+        self.compact()
+        self.file.close()
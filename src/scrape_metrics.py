@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+metrics_file_path = "data/summary/scrape_metrics.json"
+
+SHARD_COUNTERS = [
+    "pages",
+    "total_pages",
+    "rows",
+    "navigation_seconds",
+    "extraction_seconds",
+    "downloads",
+    "download_seconds",
+    "download_bytes",
+    "retries",
+    "failures",
+]
+
+
+class ScrapeMetrics:
+    """Thread-safe timings and counters for a crawl, kept per search.
+
+    Shards are identified by their manifest key ("<year>|<order type>").
+    Page timings are also kept individually so slow pages stand out.
+    """
+
+    def __init__(self, shards, path=None):
+        self.path = path or metrics_file_path
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.start_time = time.time()
+        self.shards = {shard: dict.fromkeys(SHARD_COUNTERS, 0) for shard in shards}
+        self.page_log = []
+
+    def add(self, shard, **counters):
+        with self.lock:
+            shard_metrics = self.shards.setdefault(
+                shard, dict.fromkeys(SHARD_COUNTERS, 0)
+            )
+            for name, value in counters.items():
+                shard_metrics[name] += value
+
+    def record_page(self, shard, page_number, total_pages, rows, timings):
+        with self.lock:
+            shard_metrics = self.shards.setdefault(
+                shard, dict.fromkeys(SHARD_COUNTERS, 0)
+            )
+            shard_metrics["pages"] += 1
+            shard_metrics["rows"] += rows
+            for name, value in timings.items():
+                shard_metrics[name] += value
+            if total_pages:
+                shard_metrics["total_pages"] = total_pages
+            self.page_log.append(
+                {"shard": shard, "page": page_number, "rows": rows, **timings}
+            )
+
+    def record_download(self, shard, seconds, size, retries, failed):
+        self.add(
+            shard,
+            downloads=1,
+            download_seconds=seconds,
+            download_bytes=size,
+            retries=retries,
+            failures=1 if failed else 0,
+        )
+
+    def progress(self):
+        """Return a one-line summary of throughput and estimated time left"""
+        with self.lock:
+            elapsed = time.time() - self.start_time
+            rows = sum(shard["rows"] for shard in self.shards.values())
+            pages = sum(shard["pages"] for shard in self.shards.values())
+
+            # Searches whose page count is still unknown are assumed to be
+            # as long as the average of those already started
+            known = [s["total_pages"] for s in self.shards.values() if s["total_pages"]]
+            average_pages = sum(known) / len(known) if known else 0
+            expected_pages = sum(
+                shard["total_pages"] or average_pages for shard in self.shards.values()
+            )
+
+        rows_per_second = rows / elapsed if elapsed else 0
+        pages_per_second = pages / elapsed if elapsed else 0
+        remaining_pages = max(expected_pages - pages, 0)
+        if pages_per_second and expected_pages:
+            eta = f"{remaining_pages / pages_per_second / 60:.1f} min"
+        else:
+            eta = "unknown"
+        return (
+            f"Progress: {pages} of ~{expected_pages:.0f} pages, {rows} rows, "
+            f"{rows_per_second:.1f} rows/sec, ETA {eta}"
+        )
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.time() - self.start_time
+            totals = dict.fromkeys(SHARD_COUNTERS, 0)
+            for shard_metrics in self.shards.values():
+                for name in SHARD_COUNTERS:
+                    if name != "total_pages":
+                        totals[name] += shard_metrics[name]
+            del totals["total_pages"]
+            return {
+                "elapsed_seconds": elapsed,
+                "rows_per_second": totals["rows"] / elapsed if elapsed else 0,
+                "totals": totals,
+                "shards": {
+                    shard: dict(values) for shard, values in self.shards.items()
+                },
+                "pages": list(self.page_log),
+            }
+
+    def save(self):
+        """Write the metrics to a JSON file
+
+        Shards save as they finish, so each save writes its own temporary
+        file and replaces the output one at a time.
+        """
+        folder = os.path.dirname(self.path) or "."
+        os.makedirs(folder, exist_ok=True)
+        with self.save_lock:
+            with tempfile.NamedTemporaryFile(
+                mode="w", encoding="utf-8", dir=folder, suffix=".tmp", delete=False
+            ) as f:
+                json.dump(self.summary(), f, indent=2)
+            try:
+                os.replace(f.name, self.path)
+            except OSError:
+                os.remove(f.name)
+                raise
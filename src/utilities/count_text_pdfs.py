@@ -1,55 +1,448 @@
+import hashlib
+import json
+import mmap
 import os
 import re
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+pdf_index_path = "data/summary/pdf_index.json"
 
-def has_extractable_text(pdf_path, min_text_ratio=0.001):
+# Page classifications stored in the index, one character per page
+TEXT_PAGE = "t"
+IMAGE_PAGE = "i"
+EMPTY_PAGE = "e"
+UNKNOWN_PAGE = "?"
+
+OBJECT_HEADER = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+STREAM_OR_END = re.compile(rb"stream\r?\n|endobj")
+TOKEN = re.compile(
+    rb"<<|>>|\[|\]|/[^\s/<>\[\]()%{}]*|\(|<[0-9A-Fa-f\s]*>"
+    rb"|[+-]?(?:\d+\.?\d*|\.\d+)|[A-Za-z\"']+"
+)
+TEXT_OPERATORS = re.compile(rb"\bBT\b.*?(?:\bT[jJ]\b|['\"])", re.S)
+XOBJECT_OPERATOR = re.compile(rb"/([^\s/<>\[\]()%{}]+)\s+Do\b")
+
+
+class Ref:
+    """Indirect reference to another PDF object"""
+
+    def __init__(self, number):
+        self.number = number
+
+
+def read_literal_string(data, position):
+    """Return the end of a literal string whose "(" is at position"""
+    depth = 0
+    while position < len(data):
+        char = data[position : position + 1]
+        if char == b"\\":
+            position += 2
+            continue
+        if char == b"(":
+            depth += 1
+        elif char == b")":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return position
+
+
+def parse_object(data, position=0):
+    """Parse a PDF object from bytes, returning (value, next position).
+
+    Dictionaries become dicts keyed by name, arrays lists, names strings
+    starting with "/", and "n g R" references Ref objects.
     """
-    Check if a PDF likely has extractable text content by examining raw bytes.
+    match = TOKEN.search(data, position)
+    if match is None:
+        return None, len(data)
+    token = match.group()
+    position = match.end()
+
+    if token == b"<<":
+        value = {}
+        while True:
+            key, position = parse_object(data, position)
+            if key is None or key == ">>":
+                return value, position
+            value[key], position = parse_object(data, position)
+    if token == b"[":
+        value = []
+        while True:
+            item, position = parse_object(data, position)
+            if item is None or item == "]":
+                return value, position
+            value.append(item)
+    if token == b"(":
+        end = read_literal_string(data, match.start())
+        return data[match.start() + 1 : end - 1], end
+    if token.startswith(b"<"):
+        return token, position
+    if token[:1].isdigit() or token[:1] in b"+-.":
+        number = float(token) if b"." in token else int(token)
+        # Look ahead for an indirect reference
+        reference = re.match(rb"\s+\d+\s+R\b", data[position : position + 24])
+        if reference and isinstance(number, int):
+            return Ref(number), position + reference.end()
+        return number, position
+    return token.decode("latin-1"), position
+
+
+def decode_stream(dictionary, data):
+    """Decompress stream data, or return None if the filter is unsupported"""
+    filters = dictionary.get("/Filter")
+    if filters is None:
+        return data
+    if not isinstance(filters, list):
+        filters = [filters]
+    for stream_filter in filters:
+        if stream_filter != "/FlateDecode":
+            return None
+        try:
+            data = zlib.decompressobj().decompress(data)
+        except zlib.error:
+            return None
+    return data
+
+
+class PdfObjects:
+    """Objects of a PDF file, located by scanning the memory-mapped file.
+
+    Only the offsets of stream data are kept, so streams are read and
+    decompressed when they are needed. Objects packed in object streams
+    are unpacked as they are found. Later definitions replace earlier
+    ones, as they do in incremental updates.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.objects = {}
+        self.object_streams = []
+
+        position = 0
+        while True:
+            header = OBJECT_HEADER.search(content, position)
+            if header is None:
+                break
+            body = STREAM_OR_END.search(content, header.end())
+            if body is None:
+                break
+            dictionary, _ = parse_object(content[header.end() : body.start()])
+            stream = None
+            position = body.end()
+            if body.group().startswith(b"stream"):
+                stream_end = content.find(b"endstream", position)
+                if stream_end == -1:
+                    break
+                stream = (position, stream_end)
+                position = stream_end + len(b"endstream")
+            number = int(header.group(1))
+            self.objects[number] = (dictionary, stream)
+            if isinstance(dictionary, dict) and dictionary.get("/Type") == "/ObjStm":
+                self.object_streams.append(number)
+
+        for number in self.object_streams:
+            self.unpack_object_stream(number)
+
+    def unpack_object_stream(self, number):
+        dictionary, _ = self.objects[number]
+        data = self.stream_data(number)
+        if data is None:
+            return
+        first = dictionary.get("/First", 0)
+        header = re.findall(rb"\d+", data[:first])
+        pairs = [
+            (int(header[i]), int(header[i + 1])) for i in range(0, len(header) - 1, 2)
+        ]
+        for index, (object_number, offset) in enumerate(pairs):
+            end = pairs[index + 1][1] if index + 1 < len(pairs) else len(data) - first
+            # Objects defined directly in the file take precedence
+            if object_number not in self.objects:
+                value, _ = parse_object(data[first + offset : first + end])
+                self.objects[object_number] = (value, None)
+
+    def resolve(self, value):
+        seen = set()
+        while isinstance(value, Ref) and value.number not in seen:
+            seen.add(value.number)
+            value = self.objects.get(value.number, (None, None))[0]
+        return value
+
+    def stream_data(self, number):
+        dictionary, stream = self.objects.get(number, (None, None))
+        if stream is None:
+            return None
+        start, end = stream
+        return decode_stream(dictionary, bytes(self.content[start:end]).rstrip(b"\r\n"))
+
+    def pages(self):
+        """Return (page dictionary, resources) in document order"""
+        catalogs = [
+            value
+            for value, _ in self.objects.values()
+            if isinstance(value, dict) and value.get("/Type") == "/Catalog"
+        ]
+        pages = []
+        if catalogs:
+            self.walk_page_tree(catalogs[-1].get("/Pages"), None, pages, set())
+        if not pages:
+            # Fall back to object order for files with a broken page tree
+            pages = [
+                (value, value.get("/Resources"))
+                for _, (value, _) in sorted(self.objects.items())
+                if isinstance(value, dict) and value.get("/Type") == "/Page"
+            ]
+        return pages
+
+    def walk_page_tree(self, node_ref, resources, pages, seen):
+        if isinstance(node_ref, Ref):
+            if node_ref.number in seen:
+                return
+            seen.add(node_ref.number)
+        node = self.resolve(node_ref)
+        if not isinstance(node, dict):
+            return
+        # Resources are inherited from parent nodes
+        resources = node.get("/Resources", resources)
+        if node.get("/Type") == "/Pages" or "/Kids" in node:
+            for kid in self.resolve(node.get("/Kids")) or []:
+                self.walk_page_tree(kid, resources, pages, seen)
+        else:
+            pages.append((node, resources))
+
+    def content_data(self, contents):
+        """Return the decoded content of a page, or None if unreadable"""
+        # Contents is a stream reference or an (indirect) array of them
+        if isinstance(contents, Ref):
+            value = self.resolve(contents)
+            contents = value if isinstance(value, list) else [contents]
+        parts = []
+        for part in contents if isinstance(contents, list) else []:
+            if not isinstance(part, Ref):
+                continue
+            data = self.stream_data(part.number)
+            if data is None:
+                return None
+            parts.append(data)
+        return b"\n".join(parts)
+
+    def classify_content(self, data, resources, depth=0):
+        """Classify content as text, image or empty, following form XObjects"""
+        if TEXT_OPERATORS.search(data):
+            return TEXT_PAGE
+
+        xobjects = self.resolve((self.resolve(resources) or {}).get("/XObject"))
+        kind = EMPTY_PAGE
+        for name in XOBJECT_OPERATOR.findall(data):
+            xobject_ref = (xobjects or {}).get("/" + name.decode("latin-1"))
+            if not isinstance(xobject_ref, Ref):
+                kind = IMAGE_PAGE
+                continue
+            xobject = self.resolve(xobject_ref)
+            if isinstance(xobject, dict) and xobject.get("/Subtype") == "/Form":
+                form_data = self.stream_data(xobject_ref.number)
+                if depth < 3 and form_data is not None:
+                    form_kind = self.classify_content(
+                        form_data, xobject.get("/Resources", resources), depth + 1
+                    )
+                    if form_kind == TEXT_PAGE:
+                        return TEXT_PAGE
+                    if form_kind == IMAGE_PAGE:
+                        kind = IMAGE_PAGE
+            else:
+                kind = IMAGE_PAGE
+        return kind
+
+
+def has_text_markers(content):
+    """
+    Check raw PDF bytes for signs of text content.
 
     PDFs with embedded text contain text streams with readable content,
-    while scanned PDFs are mostly compressed image data.
+    while scanned PDFs are mostly compressed image data. This is used when
+    the page tree of a PDF cannot be read.
+    """
+    # Look for text stream markers and font definitions
+    has_fonts = b"/Font" in content or b"/Type /Font" in content
+    has_text_objects = b"BT" in content and b"ET" in content  # Begin/End Text markers
+
+    # Count text-like sequences in streams (after decompression markers)
+    # Look for patterns like "(text)" or "<hex>" which are PDF text operators
+    text_patterns = re.findall(rb"\([\x20-\x7e]{10,}\)", content)
+    text_content_size = sum(len(p) for p in text_patterns)
+
+    # Also check for ToUnicode maps which indicate text encoding
+    has_tounicode = b"/ToUnicode" in content
+
+    # Heuristic: has fonts AND (text objects with content OR unicode maps)
+    if has_fonts and has_text_objects:
+        # Check if there's meaningful text content
+        if text_content_size > 100 or has_tounicode:
+            return True
+        # Additional check: look for Tj/TJ operators (show text)
+        if b"Tj" in content or b"TJ" in content:
+            return True
+
+    return False
+
+
+def classify_pdf(pdf_path):
+    """
+    Classify each page of a PDF as text, image (scanned) or empty.
+
+    The file is memory-mapped and its content streams are decompressed one
+    at a time, so large files are not read into memory at once.
+
+    Returns:
+        dict: sha256, page count, page classifications (one character per
+        page), the ratio of text pages and whether the PDF has a text layer
+    """
+    pdf_path = str(pdf_path)
+    stat = os.stat(pdf_path)
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    page_types = []
+
+    if stat.st_size == 0:
+        entry["sha256"] = hashlib.sha256().hexdigest()
+        entry["error"] = "Empty file"
+    else:
+        with (
+            open(pdf_path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content,
+        ):
+            entry["sha256"] = hashlib.sha256(content).hexdigest()
+            try:
+                pdf = PdfObjects(content)
+                for page, resources in pdf.pages():
+                    data = pdf.content_data(page.get("/Contents"))
+                    if data is None:
+                        page_types.append(UNKNOWN_PAGE)
+                    else:
+                        page_types.append(pdf.classify_content(data, resources))
+            except Exception as e:
+                page_types = []
+                entry["error"] = f"{type(e).__name__}: {e}"
+
+            if not page_types or UNKNOWN_PAGE in page_types:
+                # Fall back to the raw byte heuristic, e.g. for encrypted files
+                entry["raw_text_markers"] = has_text_markers(content)
+
+    page_types = "".join(page_types)
+    entry["pages"] = len(page_types)
+    entry["page_types"] = page_types
+    entry["text_ratio"] = (
+        page_types.count(TEXT_PAGE) / len(page_types) if page_types else 0
+    )
+    entry["has_text"] = TEXT_PAGE in page_types or entry.get("raw_text_markers", False)
+    return entry
+
+
+class PdfIndex:
+    """Persistent classification of PDFs, keyed by path.
+
+    Entries are reused while the file size and modification time match,
+    so classifying a folder that has been indexed before is near-instant.
+    The index can be shared between threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or pdf_index_path
+        self.entries = {}
+        self.lock = threading.RLock()
+        if os.path.exists(self.path):
+            with open(self.path, mode="r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def cached(self, pdf_path):
+        """Return the index entry for a file, or None if it is out of date"""
+        with self.lock:
+            entry = self.entries.get(str(pdf_path))
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(pdf_path)
+        except OSError:
+            return None
+        if entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def update(self, pdf_paths, workers=None):
+        """Classify the files that are not indexed yet, in parallel.
+
+        With workers=1 the files are classified in this process, without
+        starting a pool.
+        """
+        pdf_paths = [str(pdf_path) for pdf_path in pdf_paths]
+        stale = [pdf_path for pdf_path in pdf_paths if self.cached(pdf_path) is None]
+        if stale:
+            print(f"Classifying {len(stale)} PDFs...")
+            if workers == 1:
+                entries = map(classify_pdf, stale)
+                for pdf_path, entry in zip(stale, entries):
+                    with self.lock:
+                        self.entries[pdf_path] = entry
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    entries = executor.map(classify_pdf, stale, chunksize=8)
+                    for pdf_path, entry in zip(stale, entries):
+                        with self.lock:
+                            self.entries[pdf_path] = entry
+            self.save()
+        with self.lock:
+            return {pdf_path: self.entries[pdf_path] for pdf_path in pdf_paths}
+
+    def classification(self, pdf_path):
+        """Return the index entry for a file, classifying it if needed"""
+        entry = self.cached(pdf_path)
+        if entry is None:
+            entry = classify_pdf(pdf_path)
+            with self.lock:
+                self.entries[str(pdf_path)] = entry
+        return entry
+
+    def has_text(self, pdf_path, min_text_ratio=0.0):
+        entry = self.classification(pdf_path)
+        if not entry["pages"]:
+            return entry["has_text"]
+        return entry["has_text"] and entry["text_ratio"] >= min_text_ratio
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with self.lock:
+            with open(temp_path, mode="w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.path)
+
+
+def has_extractable_text(pdf_path, min_text_ratio=0.0):
+    """
+    Check if a PDF has an extractable text layer.
 
     Args:
         pdf_path: Path to the PDF file
-        min_text_ratio: Minimum ratio of text-like content to file size
+        min_text_ratio: Minimum fraction of pages that must contain text
 
     Returns:
-        bool: True if the PDF likely has extractable text
+        bool: True if the PDF has extractable text
     """
     try:
-        with open(pdf_path, "rb") as f:
-            content = f.read()
-
-        # Look for text stream markers and font definitions
-        has_fonts = b"/Font" in content or b"/Type /Font" in content
-        has_text_objects = b"BT" in content and b"ET" in content  # Begin/End Text markers
-
-        # Count text-like sequences in streams (after decompression markers)
-        # Look for patterns like "(text)" or "<hex>" which are PDF text operators
-        text_patterns = re.findall(rb'\([\x20-\x7e]{10,}\)', content)
-        text_content_size = sum(len(p) for p in text_patterns)
-
-        # Also check for ToUnicode maps which indicate text encoding
-        has_tounicode = b"/ToUnicode" in content
-
-        # Heuristic: has fonts AND (text objects with content OR unicode maps)
-        if has_fonts and has_text_objects:
-            # Check if there's meaningful text content
-            if text_content_size > 100 or has_tounicode:
-                return True
-            # Additional check: look for Tj/TJ operators (show text)
-            if b"Tj" in content or b"TJ" in content:
-                return True
-
-        return False
+        entry = classify_pdf(pdf_path)
+        if not entry["pages"]:
+            return entry["has_text"]
+        return entry["has_text"] and entry["text_ratio"] >= min_text_ratio
 
     except Exception as e:
-        print(f"  Warning: Could not read {pdf_path.name}: {e}")
+        print(f"  Warning: Could not read {Path(pdf_path).name}: {e}")
         return False
 
 
-def count_pdfs_in_folder(folder_path):
+def count_pdfs_in_folder(folder_path, index=None, workers=None):
     """
     Count text-encoded vs scanned PDFs in a folder.
 
@@ -60,26 +453,26 @@ def count_pdfs_in_folder(folder_path):
     if not folder.exists():
         return 0, 0, 0, 0
 
-    pdf_files = list(folder.glob("*.pdf"))
+    index = index or PdfIndex()
+    pdf_files = sorted(folder.glob("*.pdf"))
     total = len(pdf_files)
     text_encoded = 0
     scanned = 0
     errors = 0
 
-    for pdf_file in pdf_files:
-        try:
-            if has_extractable_text(pdf_file):
-                text_encoded += 1
-            else:
-                scanned += 1
-        except Exception:
+    for entry in index.update(pdf_files, workers).values():
+        if "error" in entry and not entry["pages"]:
             errors += 1
+        elif entry["has_text"]:
+            text_encoded += 1
+        else:
+            scanned += 1
 
     return total, text_encoded, scanned, errors
 
 
 def main():
-    base_path = Path(__file__).parent.parent.parent / "data" / "downloaded_pdfs"
+    base_path = Path(__file__).parent.parent.parent / "data" / "downloaded_docs"
 
     subfolders = ["determinations", "tribunals"]
 
@@ -87,6 +480,7 @@ def main():
     print("PDF Text Content Analysis")
     print("=" * 60)
 
+    index = PdfIndex()
     grand_total = 0
     grand_text = 0
     grand_scanned = 0
@@ -100,7 +494,7 @@ def main():
             print(f"  Folder not found: {folder_path}")
             continue
 
-        total, text_encoded, scanned, errors = count_pdfs_in_folder(folder_path)
+        total, text_encoded, scanned, errors = count_pdfs_in_folder(folder_path, index)
 
         if total == 0:
             print("  No PDF files found")
@@ -124,8 +518,12 @@ def main():
     print("-" * 40)
     if grand_total > 0:
         print(f"  Total PDFs:      {grand_total}")
-        print(f"  Text-encoded:    {grand_text} ({(grand_text/grand_total)*100:.1f}%)")
-        print(f"  Scanned/Image:   {grand_scanned} ({(grand_scanned/grand_total)*100:.1f}%)")
+        print(
+            f"  Text-encoded:    {grand_text} ({(grand_text / grand_total) * 100:.1f}%)"
+        )
+        print(
+            f"  Scanned/Image:   {grand_scanned} ({(grand_scanned / grand_total) * 100:.1f}%)"
+        )
     print("=" * 60)
 
 
@@ -0,0 +1,43 @@
+import os
+
+from conversion_cache import ConversionCache, output_path_for
+
+
+def make_document(tmp_path, content):
+    source = tmp_path / "docs" / "orders" / "order.pdf"
+    source.parent.mkdir(parents=True, exist_ok=True)
+    source.write_bytes(content)
+    return str(source)
+
+
+def convert(cache, source, output_folder):
+    output_path = output_path_for(source, output_folder)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("text")
+    cache.record(source, output_path)
+
+
+def test_unchanged_source_is_current(tmp_path):
+    source = make_document(tmp_path, b"first")
+    output_folder = str(tmp_path / "text")
+    cache = ConversionCache({"ocr": True}, path=str(tmp_path / "manifest.json"))
+
+    assert cache.filter_stale([source], output_folder) == [source]
+    convert(cache, source, output_folder)
+    assert cache.filter_stale([source], output_folder) == []
+
+
+def test_replaced_source_is_stale_on_the_same_cache(tmp_path):
+    source = make_document(tmp_path, b"first")
+    output_folder = str(tmp_path / "text")
+    cache = ConversionCache({"ocr": True}, path=str(tmp_path / "manifest.json"))
+    convert(cache, source, output_folder)
+    assert cache.filter_stale([source], output_folder) == []
+
+    # Downloaded again under the same name
+    make_document(tmp_path, b"second version")
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert cache.filter_stale([source], output_folder) == [source]
@@ -0,0 +1,130 @@
+import os
+import time
+
+import pytest
+
+import convert_documents as converter
+from convert_documents import convert_documents
+from ocr_backends import OcrBackend
+
+
+class UpperCaseBackend(OcrBackend):
+    """Reads .txt files in upper case, failing on files that say so"""
+
+    name = "upper"
+    extensions = {".txt"}
+
+    def prepare(self, file_paths, workers=None):
+        pass
+
+    def convert(self, file_path):
+        self.route = "upper"
+        with open(file_path, encoding="utf8") as f:
+            for line in f:
+                if "fail" in line:
+                    raise ValueError("unreadable")
+                yield line.upper()
+
+
+class HungryBackend(UpperCaseBackend):
+    """Holds on to 300 MB while reading files that ask for it"""
+
+    name = "hungry"
+
+    def convert(self, file_path):
+        with open(file_path, encoding="utf8") as f:
+            if "hungry" in f.read():
+                memory = b"x" * (300 * 1024 * 1024)
+                time.sleep(60)
+                del memory
+        yield from super().convert(file_path)
+
+
+class SlowBackend(UpperCaseBackend):
+    """Stalls on files that ask for it, with a second per document"""
+
+    name = "slow"
+    run_in_worker = True
+
+    def time_limit(self, file_path):
+        return 1
+
+    def convert(self, file_path):
+        with open(file_path, encoding="utf8") as f:
+            if "stall" in f.read():
+                time.sleep(60)
+        yield from super().convert(file_path)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / "docs" / "orders"
+    folder.mkdir(parents=True)
+    (folder / "a.txt").write_text("first order\n", encoding="utf8")
+    (folder / "b.txt").write_text("second order\n", encoding="utf8")
+    (folder / "c.txt").write_text("please fail\n", encoding="utf8")
+    return tmp_path
+
+
+def test_backends_must_implement_convert():
+    with pytest.raises(TypeError):
+        OcrBackend()
+
+
+def test_documents_are_converted_once(corpus, capsys):
+    convert_documents("docs", "text", UpperCaseBackend())
+
+    assert (corpus / "text" / "orders" / "a.txt").read_text() == "FIRST ORDER\n"
+    assert (corpus / "text" / "orders" / "b.txt").read_text() == "SECOND ORDER\n"
+    assert not os.path.exists(corpus / "text" / "orders" / "c.txt")
+    assert not os.path.exists(corpus / "text" / "orders" / "c.txt.part")
+    output = capsys.readouterr().out
+    assert "Processed (upper): docs/orders/a.txt" in output
+    assert "Converted 2 documents (1 failed)" in output
+
+    convert_documents("docs", "text", UpperCaseBackend())
+
+    output = capsys.readouterr().out
+    assert "Skipping 2 unchanged documents" in output
+    assert "Processing (upper): docs/orders/c.txt" in output
+
+
+def test_documents_are_converted_on_worker_processes(corpus, capsys):
+    convert_documents("docs", "text", UpperCaseBackend(), use_cache=False, workers=2)
+
+    assert (corpus / "text" / "orders" / "b.txt").read_text() == "SECOND ORDER\n"
+    output = capsys.readouterr().out
+    assert output.index("[1/3] Processed") < output.index("[2/3] Processed")
+    assert "Converted 2 documents (1 failed)" in output
+
+
+def test_workers_over_the_memory_limit_are_replaced(corpus, capsys, monkeypatch):
+    monkeypatch.setattr(converter, "monitor_interval", 0.1)
+    (corpus / "docs" / "orders" / "b.txt").write_text("hungry\n", encoding="utf8")
+    start_time = time.time()
+
+    convert_documents(
+        "docs", "text", HungryBackend(), use_cache=False, max_memory_mb=200
+    )
+
+    assert time.time() - start_time < 30
+    assert (corpus / "text" / "orders" / "a.txt").read_text() == "FIRST ORDER\n"
+    assert not os.path.exists(corpus / "text" / "orders" / "b.txt")
+    output = capsys.readouterr().out
+    assert "docs/orders/b.txt: MemoryError" in output
+    assert "Converted 1 documents (2 failed)" in output
+
+
+def test_workers_past_the_time_limit_are_replaced(corpus, capsys, monkeypatch):
+    monkeypatch.setattr(converter, "monitor_interval", 0.1)
+    (corpus / "docs" / "orders" / "a.txt").write_text("stall\n", encoding="utf8")
+    start_time = time.time()
+
+    convert_documents("docs", "text", SlowBackend(), use_cache=False)
+
+    assert time.time() - start_time < 30
+    assert (corpus / "text" / "orders" / "b.txt").read_text() == "SECOND ORDER\n"
+    output = capsys.readouterr().out
+    assert "docs/orders/a.txt: TimeoutError" in output
+    assert "Converted 1 documents (2 failed)" in output
@@ -0,0 +1,22 @@
+import os
+
+from extraction_cache import ExtractionCache
+
+
+def test_prune_keeps_other_input_folders(tmp_path):
+    cache = ExtractionCache(path=str(tmp_path / "cache.json"))
+    first = os.path.join(str(tmp_path), "first")
+    second = os.path.join(str(tmp_path), "second")
+    for file_path in [
+        os.path.join(first, "a.txt"),
+        os.path.join(first, "removed.txt"),
+        os.path.join(second, "b.txt"),
+    ]:
+        cache.record(file_path, {"sha256": "0"})
+
+    cache.prune(first + "/", [os.path.join(first, "a.txt")])
+
+    assert sorted(cache.entries) == [
+        os.path.join(first, "a.txt"),
+        os.path.join(second, "b.txt"),
+    ]
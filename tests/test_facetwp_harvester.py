@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import download_determination_orders as downloader
+import scrape_manifest
+import scrape_metrics
+from facetwp_harvester import (
+    HarvestError,
+    build_refresh_payload,
+    date_facet,
+    iter_listing_pages,
+    parse_listing,
+    refresh_path,
+    type_facet,
+)
+from metadata_sinks import open_sink, read_json_lines
+from scrape_manifest import ScrapeManifest
+from scrape_metrics import ScrapeMetrics
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "facetwp_refresh.json")
+
+
+@pytest.fixture
+def recorded_pages():
+    """Refresh responses recorded from the listing, by page number"""
+    with open(FIXTURE, encoding="utf-8") as f:
+        return {int(page): response for page, response in json.load(f).items()}
+
+
+@pytest.fixture
+def refresh_server(recorded_pages):
+    """Serve the recorded pages on localhost, answering page 2 last.
+
+    server.responses maps a page number to a replacement body or status code.
+    """
+    responses = {}
+
+    class RefreshHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            page_number = json.loads(body)["data"]["paged"]
+            # Later pages answer first, so ordering is up to the harvester
+            time.sleep(0.2 if page_number == 2 else 0)
+            response = responses.get(page_number, recorded_pages.get(page_number))
+            if isinstance(response, int):
+                self.send_error(response)
+                return
+            if isinstance(response, dict):
+                response = json.dumps(response)
+            body = (response or "").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RefreshHandler)
+    server.responses = responses
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def harvest(server, start_page=1):
+    with requests.Session() as session:
+        return list(
+            iter_listing_pages(
+                session,
+                server.url + refresh_path,
+                "/orders/",
+                2024,
+                "adjudication-order",
+                start_page,
+                workers=2,
+            )
+        )
+
+
+def test_build_refresh_payload():
+    payload = build_refresh_payload(
+        2024, "adjudication-order|tribunal-order", "/orders/", 3
+    )
+
+    data = payload["data"]
+    assert payload["action"] == "facetwp_refresh"
+    assert data["paged"] == 3
+    assert data["facets"] == {
+        date_facet: ["2024"],
+        type_facet: ["adjudication-order", "tribunal-order"],
+    }
+    assert data["http_params"]["uri"] == "orders"
+    assert (
+        build_refresh_payload("All", "adjudication-order", "/")["data"]["facets"][
+            date_facet
+        ]
+        == []
+    )
+
+
+def test_parse_listing(recorded_pages):
+    records = parse_listing(recorded_pages[1]["template"])
+
+    assert records[0] == {
+        "title": "Tenant 1 v Landlord 1",
+        "subject": "Deposit retention",
+        "dr_no": "DR1001-0124",
+        "tr_no": None,
+        "time": "11 January 2024",
+        "links": [
+            [
+                "https://rtb.ie/wp-content/uploads/2024/01/"
+                "DR1001-0124-determination-order.pdf",
+                "Determination Order",
+            ]
+        ],
+    }
+    row = downloader.build_item_data(parse_listing(recorded_pages[1]["template"])[1])
+    assert row["DR No."] == "DR1002-0224"
+    assert row["TR No."] == "TR0224-002"
+    assert row["Upload Date"] == "12/02/2024"
+    assert row["Tribunal Doc"].endswith("TR0224-002-tribunal-order.pdf")
+
+
+def test_pages_are_yielded_in_order(refresh_server):
+    pages = harvest(refresh_server)
+
+    assert [(number, total) for number, total, _ in pages] == [(1, 3), (2, 3), (3, 3)]
+    titles = [record["title"] for _, _, records in pages for record in records]
+    assert titles == [f"Tenant {n} v Landlord {n}" for n in range(1, 7)]
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        500,
+        "<html>Service unavailable</html>",
+        {"settings": {"pager": {"total_rows": 6, "total_pages": 3}}},
+        {"template": "<div></div>", "settings": {"pager": {"total_rows": 6}}},
+    ],
+    ids=["server error", "not json", "no template", "no articles"],
+)
+def test_unusable_responses_raise_harvest_error(refresh_server, response):
+    refresh_server.responses[2] = response
+
+    with pytest.raises(HarvestError) as error:
+        harvest(refresh_server)
+
+    assert error.value.page_number == 2
+
+
+def test_search_falls_back_to_the_browser_at_the_failed_page(
+    refresh_server, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(downloader, "site_url", refresh_server.url)
+    monkeypatch.setattr(downloader, "shard_spool_folder", str(tmp_path / "shards"))
+    refresh_server.responses[3] = "<html>Service unavailable</html>"
+    shard = (2024, "adjudication-order")
+    manifest = ScrapeManifest(str(tmp_path / "manifest.jsonl"))
+    sink = open_sink("jsonl", str(tmp_path / "rows.jsonl"), downloader.CSV_FIELDNAMES)
+    metrics = ScrapeMetrics(["2024|adjudication-order"], str(tmp_path / "m.json"))
+    crawl = downloader.CrawlState(manifest, [shard], sink, metrics=metrics)
+
+    with requests.Session() as session:
+        start_page = downloader.scrape_search_http(session, crawl, *shard)
+    sink.close()
+
+    assert start_page == 3
+    assert manifest.resume_page(*shard) == 3
+    rows = list(read_json_lines(str(tmp_path / "rows.jsonl")))
+    assert [row["DR No."] for row in rows] == [
+        "DR1001-0124",
+        "DR1002-0224",
+        "DR1003-0324",
+        "DR1004-0424",
+    ]
+    manifest.close()
+
+
+@pytest.mark.parametrize("broken_page", [None, 2])
+def test_playwright_only_starts_for_the_browser_fallback(
+    refresh_server, tmp_path, monkeypatch, broken_page
+):
+    for name, path in [
+        ("csv_output_file_path", "case_metadata.csv"),
+        ("shard_spool_folder", "shards"),
+        ("download_index_path", "download_index.json"),
+    ]:
+        monkeypatch.setattr(downloader, name, str(tmp_path / path))
+    monkeypatch.setattr(downloader, "site_url", refresh_server.url)
+    monkeypatch.setattr(
+        scrape_manifest, "manifest_file_path", str(tmp_path / "m.jsonl")
+    )
+    monkeypatch.setattr(scrape_metrics, "metrics_file_path", str(tmp_path / "m.json"))
+    started = []
+
+    def sync_playwright():
+        started.append(True)
+        raise RuntimeError("No browser in tests")
+
+    monkeypatch.setattr(downloader, "sync_playwright", sync_playwright)
+    if broken_page:
+        refresh_server.responses[broken_page] = 500
+
+    downloader.get_search_results(
+        browserless=True, preferences=(2024, "adjudication-order", False)
+    )
+
+    assert started == ([True] if broken_page else [])
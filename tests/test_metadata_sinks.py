@@ -0,0 +1,42 @@
+import csv
+import sqlite3
+
+import pytest
+
+from metadata_sinks import SINKS, SqliteSink, open_sink, read_json_lines
+
+FIELDNAMES = ["Title", "DR No.", "Determination Doc"]
+
+
+def order(number):
+    return {
+        "Title": f"Order {number}",
+        "DR No.": f"DR{number}",
+        "Determination Doc": f"https://example.com/{number}.pdf",
+    }
+
+
+def read_titles(output_format, path):
+    if output_format == "sqlite":
+        with sqlite3.connect(path) as connection:
+            query = f"SELECT Title FROM {SqliteSink.table}"
+            return [title for (title,) in connection.execute(query)]
+    if output_format == "jsonl":
+        return [row["Title"] for row in read_json_lines(path)]
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["Title"] for row in csv.DictReader(f)]
+
+
+@pytest.mark.parametrize("output_format", list(SINKS))
+def test_resume_skips_rows_already_written(tmp_path, output_format):
+    path = str(tmp_path / f"metadata{SINKS[output_format][1]}")
+    # A page written just before a crash, before the manifest recorded it
+    with open_sink(output_format, path, FIELDNAMES) as sink:
+        sink.write_rows([order(1), order(2)])
+
+    # On resume the page is read again, followed by the next one
+    with open_sink(output_format, path, FIELDNAMES, append=True) as sink:
+        sink.write_rows([order(1), order(2)])
+        sink.write_rows([order(3)])
+
+    assert read_titles(output_format, path) == ["Order 1", "Order 2", "Order 3"]
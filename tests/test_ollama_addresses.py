@@ -0,0 +1,69 @@
+import threading
+
+import ollama_addresses
+from ollama_addresses import OllamaEngine, build_prompt, prompt_window
+from ollama_stub import create_ollama_stub
+
+
+def test_window_of_a_long_document_with_many_anchors_is_bounded():
+    paragraph = (
+        "The tenancy of the dwelling at 1 Main Street was terminated and the "
+        "property was returned. " * 5
+    )
+    text = "In the matter of A (Tenant) and B (Landlord)\n" + paragraph * 160
+    assert len(text) > 70000
+
+    window = prompt_window(text)
+
+    assert len(window) <= ollama_addresses.max_prompt_chars
+    assert window.startswith("In the matter of A (Tenant)")
+
+
+def test_separate_windows_are_bounded_in_total():
+    filler = "x " * 2000
+    text = filler.join(["tenancy of 1 Main Street"] * 10)
+
+    window = prompt_window(text)
+
+    assert window.count("tenancy of 1 Main Street") == ollama_addresses.max_windows
+    assert len(window) <= ollama_addresses.max_prompt_chars
+
+
+def test_window_of_a_document_without_anchors_is_its_opening():
+    text = "no anchors here " * 1000
+
+    assert prompt_window(text) == text[: ollama_addresses.max_prompt_chars]
+
+
+def test_short_document_is_sent_whole():
+    text = "In the matter of A and B, relating to the tenancy of 1 Main Street."
+
+    assert prompt_window(text) == text
+    assert text in build_prompt(text)
+
+
+def test_unchanged_prompt_is_answered_from_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        ollama_addresses, "metrics_file_path", str(tmp_path / "metrics.jsonl")
+    )
+    server = create_ollama_stub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+    text = "The tenancy of the dwelling at 1 Main Street, Dublin. was terminated."
+    cache_folder = str(tmp_path / "responses")
+
+    try:
+        engine = OllamaEngine(host=host, model="llama3", cache_folder=cache_folder)
+        assert engine.extract_address(text) == "1 Main Street, Dublin"
+        # A later run reads the same prompt from the cache on disk
+        engine = OllamaEngine(host=host, model="llama3", cache_folder=cache_folder)
+        assert engine.extract_address(text) == "1 Main Street, Dublin"
+        assert (engine.cache_hits, server.requests) == (1, 1)
+
+        # Another model is asked again
+        engine = OllamaEngine(host=host, model="mistral", cache_folder=cache_folder)
+        engine.extract_address(text)
+        assert server.requests == 2
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,20 @@
+import read_determination_orders
+from read_determination_orders import KeywordMatcher, find_keywords
+
+
+def test_keywords_are_listed_with_counts_and_offsets(monkeypatch):
+    matcher = KeywordMatcher(["rent arrears", "breach", "deposit"])
+    monkeypatch.setattr(read_determination_orders, "keyword_matcher", matcher)
+    text = "A breach of\nthe lease. Rent  arrears were owed, and a further breach."
+
+    matches, hits = find_keywords(text)
+
+    assert matches == ["rent arrears", "breach"]
+    assert hits["breach"]["count"] == 2
+    assert [text[start:end] for start, end in hits["breach"]["offsets"]] == [
+        "breach",
+        "breach",
+    ]
+    assert [text[start:end] for start, end in hits["rent arrears"]["offsets"]] == [
+        "Rent  arrears"
+    ]
@@ -0,0 +1,28 @@
+from scrape_manifest import ScrapeManifest, order_keys
+
+
+def order(number):
+    return {"DR No.": f"DR{number}", "Determination Doc": f"/{number}.pdf"}
+
+
+def test_resume_after_partial_page(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = ScrapeManifest(path)
+    manifest.record_page(2024, "adjudication-order", 1, [order(1), order(2)])
+    manifest.file.close()
+
+    # A crash while page 2 was being recorded leaves part of a line
+    with open(path, mode="a", encoding="utf-8") as f:
+        f.write('{"keys": ["' + order_keys(order(3))[0])
+
+    manifest = ScrapeManifest(path)
+    assert manifest.resume_page(2024, "adjudication-order") == 2
+    assert manifest.filter_new([order(2), order(3)]) == [order(3)]
+
+    manifest.record_page(2024, "adjudication-order", 2, [order(3)])
+    manifest.file.close()
+
+    manifest = ScrapeManifest(path)
+    assert manifest.resume_page(2024, "adjudication-order") == 3
+    assert manifest.filter_new([order(1), order(3), order(4)]) == [order(4)]
+    manifest.close()
@@ -0,0 +1,28 @@
+import json
+import os
+import threading
+
+from scrape_metrics import ScrapeMetrics
+
+
+def test_concurrent_saves(tmp_path):
+    metrics = ScrapeMetrics(["2024|adjudication-order"], path=str(tmp_path / "m.json"))
+    metrics.add("2024|adjudication-order", rows=3)
+    errors = []
+
+    def save():
+        try:
+            metrics.save()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == ["m.json"]
+    with open(tmp_path / "m.json", encoding="utf-8") as f:
+        assert json.load(f)["totals"]["rows"] == 3